@@ -0,0 +1,234 @@
+"""ACG / CCG のライン計算エンジン（Streamlit に依存しない計算コア）"""
+import itertools
+
+import numpy as np
+
+from ephemeris import PLANET_NAMES
+
+# --- 定数 ---
+
+ANGLES = ("AC", "DC", "MC", "IC")
+DEFAULT_LAT_SAMPLES = 150
+LAT_LIMIT = 85.0
+
+EARTH_RADIUS_KM = 6371.0
+LOCAL_SPACE_SAMPLES = 100
+LOCAL_SPACE_DISTANCE_KM = (100.0, 20000.0)
+# 適応サンプリングで点を密にする範囲（度）と、その範囲での密度の上乗せ量
+_DENSE_WIDTH_DEG = 10.0
+_DENSE_WEIGHT = 4.0
+_PROBE_SAMPLES = 512
+
+
+def make_latitudes(n_samples=DEFAULT_LAT_SAMPLES, limit=LAT_LIMIT):
+    """AC/DC ラインを評価する緯度の配列（度）を返す"""
+    return np.linspace(-limit, limit, int(n_samples))
+
+
+def wrap_lon(lon_deg):
+    """経度を [-180, 180) に正規化する"""
+    return (np.asarray(lon_deg) + 180.0) % 360.0 - 180.0
+
+
+# --- ACG ライン ---
+def acg_lines_from_radec(ra_rad, dec_rad, gst_rad, latitudes):
+    """赤経・赤緯・グリニッジ恒星時から全惑星 × 全緯度の AC/DC/MC/IC 経度を一括計算する
+
+    ra_rad, dec_rad は形状 (P,)、latitudes は (L,)。
+    戻り値の "AC"/"DC" は (P, L) の配列で、地平線と交わらない緯度（|cos LHA| > 1）は NaN。
+    "MC"/"IC" は (P,) の配列。
+    """
+    ra_rad = np.asarray(ra_rad, dtype=float)
+    dec_rad = np.asarray(dec_rad, dtype=float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    lon_mc = wrap_lon(np.degrees(ra_rad - gst_rad))
+    lon_ic = wrap_lon(lon_mc + 180.0)
+
+    lat_rad = np.radians(latitudes)
+    with np.errstate(invalid='ignore'):
+        cos_lha = -np.tan(dec_rad)[..., None] * np.tan(lat_rad)
+        lha_rad = np.arccos(np.where(np.abs(cos_lha) <= 1.0, cos_lha, np.nan))
+    base = (ra_rad - gst_rad)[..., None]
+    lon_ac = wrap_lon(np.degrees(base - lha_rad))
+    lon_dc = wrap_lon(np.degrees(base + lha_rad))
+    return {"latitudes": latitudes, "AC": lon_ac, "DC": lon_dc, "MC": lon_mc, "IC": lon_ic}
+
+
+def compute_acg_arrays(provider, calculation_dt_utc, planet_names, n_lat_samples=DEFAULT_LAT_SAMPLES):
+    """指定時刻の ACG ラインを配列形式で計算する（provider は ephemeris のプロバイダ）"""
+    planet_names = [p for p in planet_names if p in PLANET_NAMES]
+    ra_rad, dec_rad, gst_rad = provider.radec(calculation_dt_utc, planet_names)
+    arrays = acg_lines_from_radec(ra_rad, dec_rad, gst_rad, make_latitudes(n_lat_samples))
+    arrays["planets"] = planet_names
+    return arrays
+
+
+# --- 時系列（CCG アニメーション・通過日検索用） ---
+def compute_acg_timeseries(provider, datetimes_utc, planet_names, n_lat_samples=DEFAULT_LAT_SAMPLES, dtype=np.float64):
+    """複数の UTC 日時について ACG ラインを一括計算する
+
+    全日時をまとめて provider.radec に渡す（Skyfield では 1 つの `Time` ベクトルになり、
+    天体暦の計算がベクトル化される。Swiss Ephemeris では半日ごとの節点で計算して補間する）。
+    戻り値の "lons" は形状 (時刻数, 惑星数, 4, 緯度数) の配列で、第 3 軸は ANGLES の順
+    （AC, DC, MC, IC）。MC/IC は緯度方向に同じ値を繰り返し、AC/DC の無効な緯度は NaN。
+    """
+    planet_names = [p for p in planet_names if p in PLANET_NAMES]
+    latitudes = make_latitudes(n_lat_samples)
+    datetimes_utc = list(datetimes_utc)
+    lons = np.empty((len(datetimes_utc), len(planet_names), len(ANGLES), len(latitudes)), dtype=dtype)
+    if datetimes_utc and planet_names:
+        _fill_timeseries(provider, datetimes_utc, planet_names, latitudes, lons)
+    return {"times": datetimes_utc, "planets": planet_names, "angles": ANGLES, "latitudes": latitudes, "lons": lons}
+
+
+def iter_acg_timeseries(provider, datetimes_utc, planet_names, n_lat_samples=DEFAULT_LAT_SAMPLES, chunk_size=1000, dtype=np.float32):
+    """compute_acg_timeseries のストリーミング版
+
+    日時（イテレータ可）を chunk_size 件ずつ処理し、(開始インデックス, 結果辞書) を順に yield する。
+    1 チャンクの配列は chunk_size × 惑星数 × 4 × 緯度数 要素に収まるため、
+    10 年分の毎時データでもメモリ使用量は一定に保たれる。
+    """
+    iterator = iter(datetimes_utc)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield start, compute_acg_timeseries(provider, chunk, planet_names, n_lat_samples, dtype)
+        start += len(chunk)
+
+
+def _fill_timeseries(provider, datetimes_utc, planet_names, latitudes, out):
+    ra_rad, dec_rad, gst_rad = provider.radec(datetimes_utc, planet_names)
+    arrays = acg_lines_from_radec(ra_rad, dec_rad, gst_rad, latitudes)
+    # (惑星, 時刻, ...) を (時刻, 惑星, ...) に並べ替えて書き込む
+    out[:, :, 0, :] = arrays["AC"].transpose(1, 0, 2)
+    out[:, :, 1, :] = arrays["DC"].transpose(1, 0, 2)
+    out[:, :, 2, :] = arrays["MC"].T[..., None]
+    out[:, :, 3, :] = arrays["IC"].T[..., None]
+
+
+# --- Local Space ---
+def local_space_azimuths(ra_rad, dec_rad, gst_rad, center_lats, center_lons):
+    """各中心地から見た各惑星の方位角（北から東回り、ラジアン）を (中心地数, 惑星数) で返す
+
+    赤経・赤緯と恒星時から時角を求めて計算する（地心の位置を使うため、月は視差の分だけずれる）。
+    """
+    lat_rad = np.radians(np.asarray(center_lats, dtype=float))[:, None]
+    lha = gst_rad + np.radians(np.asarray(center_lons, dtype=float))[:, None] - np.asarray(ra_rad, dtype=float)
+    dec_rad = np.asarray(dec_rad, dtype=float)
+    return np.arctan2(np.sin(lha), np.cos(lha) * np.sin(lat_rad) - np.tan(dec_rad) * np.cos(lat_rad)) + np.pi
+
+
+def great_circle_paths(center_lats, center_lons, azimuths, n_samples=LOCAL_SPACE_SAMPLES, distance_km=LOCAL_SPACE_DISTANCE_KM, adaptive=True):
+    """中心地から各方位に伸びる大円の経路を (中心地数, 惑星数, 1 + n_samples) の緯度・経度配列で返す
+
+    先頭は中心地そのもの。残りの点は distance_km の範囲の距離に置く。adaptive=True では
+    極付近と経度 ±180 度付近に点を寄せ、それ以外の区間は疎にする（点の総数は変わらない）。
+    経度は [-180, 180) に正規化する。
+    """
+    lat0 = np.radians(np.asarray(center_lats, dtype=float))[:, None, None]
+    lon0 = np.radians(np.asarray(center_lons, dtype=float))[:, None, None]
+    azimuths = np.asarray(azimuths, dtype=float)[:, :, None]
+    d_min, d_max = (d / EARTH_RADIUS_KM for d in distance_km)
+
+    def point_at(dist_rad):
+        lat = np.arcsin(np.sin(lat0) * np.cos(dist_rad) + np.cos(lat0) * np.sin(dist_rad) * np.cos(azimuths))
+        lon = lon0 + np.arctan2(np.sin(azimuths) * np.sin(dist_rad) * np.cos(lat0), np.cos(dist_rad) - np.sin(lat0) * np.sin(lat))
+        return np.degrees(lat), wrap_lon(np.degrees(lon))
+
+    if adaptive:
+        dist_rad = _adaptive_distances(point_at, d_min, d_max, n_samples, azimuths.shape[:2])
+    else:
+        dist_rad = np.broadcast_to(np.linspace(d_min, d_max, n_samples), azimuths.shape[:2] + (n_samples,))
+    lats, lons = point_at(dist_rad)
+    start_lats = np.broadcast_to(np.degrees(lat0), azimuths.shape)
+    start_lons = np.broadcast_to(np.degrees(lon0), azimuths.shape)
+    return np.concatenate([start_lats, lats], axis=-1), np.concatenate([start_lons, lons], axis=-1)
+
+
+def _adaptive_distances(point_at, d_min, d_max, n_samples, shape):
+    """経路ごとの点密度を細かい試し点で見積もり、累積密度を n_samples 等分する距離を返す"""
+    n_paths = int(np.prod(shape))
+    if n_paths == 0:
+        # 中心地か惑星が 0 件（空の配列は下の reshape(0, -1) で形状を決められない）
+        return np.empty(shape + (n_samples,))
+    probe = np.linspace(d_min, d_max, _PROBE_SAMPLES)
+    lats, lons = point_at(probe)
+    density = 1.0 + _DENSE_WEIGHT * (np.exp(-((90.0 - np.abs(lats)) / _DENSE_WIDTH_DEG) ** 2) + np.exp(-((180.0 - np.abs(lons)) / _DENSE_WIDTH_DEG) ** 2))
+    cdf = np.concatenate([np.zeros(shape + (1,)), np.cumsum(0.5 * (density[..., 1:] + density[..., :-1]), axis=-1)], axis=-1)
+    cdf /= cdf[..., -1:]
+    # 各経路の累積密度に経路番号を足して 1 本の単調増加列にし、まとめて逆引きする
+    flat_cdf = (cdf.reshape(n_paths, -1) + np.arange(n_paths)[:, None]).ravel()
+    targets = (np.linspace(0.0, 1.0, n_samples) * (1 - 1e-12) + np.arange(n_paths)[:, None]).ravel()
+    hi = np.clip(np.searchsorted(flat_cdf, targets, side="right"), 1, len(flat_cdf) - 1)
+    lo = hi - 1
+    frac = (targets - flat_cdf[lo]) / np.maximum(flat_cdf[hi] - flat_cdf[lo], 1e-300)
+    probe_idx = lo % _PROBE_SAMPLES + frac
+    return np.interp(probe_idx, np.arange(_PROBE_SAMPLES), probe).reshape(shape + (n_samples,))
+
+
+def compute_local_space(provider, birth_dt_utc, center_lats, center_lons, planet_names, n_samples=LOCAL_SPACE_SAMPLES, adaptive=True):
+    """複数の中心地について Local Space の経路を一括計算する
+
+    天体位置は 1 回の provider.radec で全惑星分を求め、方位角と大円の経路は配列演算でまとめて計算する。
+    戻り値の "lats", "lons" は形状 (中心地数, 惑星数, 1 + n_samples)。
+    """
+    planet_names = [p for p in planet_names if p in PLANET_NAMES]
+    center_lats, center_lons = np.atleast_1d(center_lats), np.atleast_1d(center_lons)
+    ra_rad, dec_rad, gst_rad = provider.radec(birth_dt_utc, planet_names)
+    azimuths = local_space_azimuths(ra_rad, dec_rad, gst_rad, center_lats, center_lons)
+    lats, lons = great_circle_paths(center_lats, center_lons, azimuths, n_samples, adaptive=adaptive)
+    return {"planets": planet_names, "azimuths": azimuths, "lats": lats, "lons": lons}
+
+
+def arrays_to_line_dict(arrays):
+    """配列形式の ACG ラインを惑星ごとの辞書形式に変換する
+
+    AC/DC は有効な緯度だけを残した ndarray（"lons", "lats"）、MC/IC は float の "lon" を持つ。
+    """
+    latitudes = arrays["latitudes"]
+    lines = {}
+    for i, planet_name in enumerate(arrays["planets"]):
+        lines[planet_name] = {"MC": {"lon": float(arrays["MC"][i])}, "IC": {"lon": float(arrays["IC"][i])}}
+        for angle in ("AC", "DC"):
+            lons = arrays[angle][i]
+            valid = ~np.isnan(lons)
+            lines[planet_name][angle] = {"lons": lons[valid], "lats": latitudes[valid]}
+    return lines
+
+
+def line_dict_to_arrays(lines, planet_names, n_lat_samples=None):
+    """arrays_to_line_dict の逆変換（AC/DC を共通の緯度グリッド上の NaN 埋め配列に戻す）
+
+    n_lat_samples を省略すると、AC/DC の緯度の間隔から make_latitudes のグリッドを推定する。
+    緯度がそのグリッドに乗っていなければ ValueError を送出する。
+    """
+    planet_names = [p for p in planet_names if p in lines]
+    if n_lat_samples is None:
+        n_lat_samples = _infer_lat_samples(lines, planet_names)
+    latitudes = make_latitudes(n_lat_samples)
+    step = latitudes[1] - latitudes[0] if len(latitudes) > 1 else 1.0
+    arrays = {"planets": planet_names, "latitudes": latitudes}
+    for angle in ("MC", "IC"):
+        arrays[angle] = np.array([lines[p][angle]["lon"] for p in planet_names], dtype=float)
+    for angle in ("AC", "DC"):
+        values = np.full((len(planet_names), len(latitudes)), np.nan)
+        for i, planet_name in enumerate(planet_names):
+            line_data = lines[planet_name][angle]
+            lats = np.asarray(line_data["lats"], dtype=float)
+            rows = np.rint((lats - latitudes[0]) / step).astype(np.intp)
+            on_grid = (rows >= 0) & (rows < len(latitudes))
+            if not (on_grid.all() and np.allclose(latitudes[rows], lats, rtol=0.0, atol=1e-6 * step)):
+                raise ValueError(f"{planet_name} の {angle} ラインの緯度が {n_lat_samples} 点の緯度グリッドに乗っていません")
+            values[i, rows] = line_data["lons"]
+        arrays[angle] = values
+    return arrays
+
+
+def _infer_lat_samples(lines, planet_names):
+    """AC/DC の隣り合う緯度の最小間隔から、make_latitudes のサンプル数を求める（決まらなければ既定値）"""
+    steps = [np.diff(np.asarray(lines[p][angle]["lats"], dtype=float)).min() for p in planet_names for angle in ("AC", "DC") if len(lines[p][angle]["lats"]) > 1]
+    if not steps:
+        return DEFAULT_LAT_SAMPLES
+    return int(round(2 * LAT_LIMIT / min(steps))) + 1
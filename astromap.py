@@ -0,0 +1,305 @@
+"""アストロマップの計算・描画・レポート生成（Streamlit に依存しないコア）
+
+app.py（Streamlit UI）と batch_cli.py（ヘッドレスのバッチ処理）の両方から使う。
+"""
+import datetime
+import functools
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+from astro_engine import DEFAULT_LAT_SAMPLES, LAT_LIMIT, compute_acg_arrays, compute_local_space, arrays_to_line_dict, line_dict_to_arrays
+from chart_cache import ChartCache
+from city_index import DEFAULT_ORB, CityIndex
+from crossings import crossings_to_records, find_line_crossings
+from ephemeris import PLANET_NAMES, get_provider
+from heatmap import DEFAULT_GRID_STEP, downsample, evaluate_heatmap, make_grid
+from map_render import DEFAULT_SIMPLIFY_TOLERANCE, merge_hovertext, merge_polylines, simplify_polyline, split_at_antimeridian
+
+# --- 定数とデータ ---
+
+# 惑星の英語名、描画色
+PLANET_INFO = {
+    "太陽": {"en": "Sun", "color": "#FFD700"}, "月": {"en": "Moon", "color": "#C0C0C0"},
+    "水星": {"en": "Mercury", "color": "#8B4513"}, "金星": {"en": "Venus", "color": "#FF69B4"},
+    "火星": {"en": "Mars", "color": "#FF4500"}, "木星": {"en": "Jupiter", "color": "#32CD32"},
+    "土星": {"en": "Saturn", "color": "#4682B4"}, "天王星": {"en": "Uranus", "color": "#00FFFF"},
+    "海王星": {"en": "Neptune", "color": "#0000FF"}, "冥王星": {"en": "Pluto", "color": "#800080"},
+}
+
+# 惑星とアングルの元型的意味（astrocartography_detail.pdfより引用）
+ARCHETYPE_INFO = {
+    "太陽": {
+        "archetype": "英雄、王。意識の中心、エゴ、生命力、目的意識。",
+        "AC": "自己が輝き、自信に満ち溢れ、強い第一印象を与える場所。リーダーシップと自己表現を促進する。",
+        "DC": "自己の可能性を映し出すような、強力で輝かしいパートナーを引き寄せる。人間関係が自己発見の中心となる。",
+        "MC": "キャリアでの成功、社会的名声、野心的な目標の達成に最適。リーダーとして注目される場所。",
+        "IC": "家庭、家族、自身のルーツとの繋がりを通じて、活力と強い自己意識を見出す場所。"
+    },
+    "月": {
+        "archetype": "母、女王。感情、直感、安心感、大衆、過去。",
+        "AC": "感受性や直感が高まる。他者からは育成力があり、共感的であると見られる場所。",
+        "DC": "育成的な、あるいは感情的なカルマを持つパートナーを引き寄せる。人間関係において深い感情的な安心感を求める。",
+        "MC": "育成的な分野(癒し、食、不動産など)でのキャリア。高い知名度や人気を得るが、公の場での感情的な不安定さも伴う。",
+        "IC": "究極の「故郷」のライン。深い帰属意識、祖先との繋がり、感情的な安心感を得られる場所。"
+    },
+    "金星": {
+        "archetype": "恋人、芸術家。愛、美、社交性、金銭、価値観。",
+        "AC": "個人的な魅力や求心力が高まる。美しく、芸術的で、社交的に優雅な人物として見られる場所。",
+        "DC": "古典的な「ソウルメイト」または「ハネムーン」のライン。ロマンチックで調和のとれたパートナーを引き寄せる。",
+        "MC": "芸術、デザイン、外交、金融などの分野での成功。人気があり、好感度の高いパブリックイメージ。",
+        "IC": "美しく、調和のとれた快適な家庭を築く。私生活において強い平和と満足感を得られる場所。"
+    },
+    "木星": {
+        "archetype": "賢者、王。拡大、幸運、成長、知恵、楽観主義。",
+        "AC": "楽観主義、自信、幸運が増大する。寛大でスケールの大きなペルソナ。",
+        "DC": "恩恵をもたらす、賢明な、あるいは外国人のパートナーを引き寄せる。成長と機会が人間関係を通じて訪れる。",
+        "MC": "キャリアの成功、名声、豊かさを得るための最高のライン。職業的な昇進と拡大の機会に恵まれる。",
+        "IC": "広く幸福な家庭。精神的な信念と内面の成長が深まる。不動産や家族に関連して幸運がもたらされる。"
+    },
+    # 他の惑星も同様に定義可能
+}
+
+# 都道府県と世界の都市リスト
+JP_PREFECTURES = {'北海道':(43.06417,141.34694),'青森県':(40.82444,140.74),'岩手県':(39.70361,141.1525),'宮城県':(38.26889,140.87194),'秋田県':(39.71861,140.1025),'山形県':(38.24056,140.36333),'福島県':(37.75,140.46778),'茨城県':(36.34139,140.44667),'栃木県':(36.56583,139.88361),'群馬県':(36.39111,139.06083),'埼玉県':(35.86139,139.64556),'千葉県':(35.60472,140.12333),'東京都':(35.68944,139.69167),'神奈川県':(35.44778,139.6425),'新潟県':(37.90222,139.02361),'富山県':(36.69528,137.21139),'石川県':(36.59444,136.62556),'福井県':(36.06528,136.22194),'山梨県':(35.66389,138.56833),'長野県':(36.65139,138.18111),'岐阜県':(35.42306,136.72222),'静岡県':(34.97694,138.38306),'愛知県':(35.18028,136.90667),'三重県':(34.73028,136.50861),'滋賀県':(35.00444,135.86833),'京都府':(35.02139,135.75556),'大阪府':(34.68639,135.52),'兵庫県':(34.69139,135.18306),'奈良県':(34.68528,135.83278),'和歌山県':(34.22611,135.1675),'鳥取県':(35.50361,134.23833),'島根県':(35.47222,133.05056),'岡山県':(34.66167,133.935),'広島県':(34.39639,132.45944),'山口県':(34.18583,131.47139),'徳島県':(34.06583,134.55944),'香川県':(34.34028,134.04333),'愛媛県':(33.84167,132.76611),'高知県':(33.55972,133.53111),'福岡県':(33.60639,130.41806),'佐賀県':(33.26389,130.30167),'長崎県':(32.74472,129.87361),'熊本県':(32.78972,130.74167),'大分県':(33.23806,131.6125),'宮崎県':(31.91111,131.42389),'鹿児島県':(31.56028,130.55806),'沖縄県':(26.2125,127.68111)}
+WORLD_CITIES = {'東京':(35.6895,139.6917),'ロンドン':(51.5074,-0.1278),'ニューヨーク':(40.7128,-74.006),'パリ':(48.8566,2.3522),'シンガポール':(1.3521,103.8198),'香港':(22.3193,114.1694),'シドニー':(-33.8688,151.2093),'ロサンゼルス':(34.0522,-118.2437),'ドバイ':(25.2048,55.2708),'ローマ':(41.9028,12.4964),'カイロ':(30.0444,31.2357),'モスクワ':(55.7558,37.6173),'バンコク':(13.7563,100.5018),'ソウル':(37.5665,126.978),'イスタンブール':(41.0082,28.9784),'シカゴ':(41.8781,-87.6298),'ベルリン':(52.52,13.405),'マドリード':(40.4168,-3.7038),'ホノルル':(21.3069,-157.8583),'サンフランシスコ':(37.7749,-122.4194)}
+ALL_CITIES = {**{f"（日本）{k}": v for k, v in JP_PREFECTURES.items()}, **{f"（海外）{k}": v for k, v in WORLD_CITIES.items()}}
+
+
+HEATMAP_CACHE_BYTES = 512 * 1024 * 1024
+HEATMAP_DISK_BYTES = 2 * 1024 * 1024 * 1024
+HEATMAP_MIN_DISPLAY_STEP = 1.0  # 地図に描画するセルの最小の大きさ（度）。これより細かい格子は平均して描く（0.5 度では約 4 MB になる）
+HEATMAP_PX_PER_DEG = 2.5  # 既定の表示サイズで経度 1 度あたりのピクセル数（マーカーの大きさの目安）
+
+# --- キャッシュ ---
+def load_ephemeris():
+    """同梱の天体暦ファイルからプロバイダを作成する（プロセス内でキャッシュ）"""
+    return get_provider()
+
+@functools.lru_cache(maxsize=None)
+def load_chart_cache():
+    """惑星ごとの計算結果のキャッシュ（プロセス内で共有。環境変数 CHART_CACHE_DIR があればディスクにも保存）"""
+    return ChartCache(disk_dir=os.environ.get("CHART_CACHE_DIR"))
+
+@functools.lru_cache(maxsize=None)
+def load_heatmap_cache():
+    """惑星ごとのヒートマップのキャッシュ（1 枚が大きいので容量で制限する）"""
+    cache_dir = os.environ.get("CHART_CACHE_DIR")
+    return ChartCache(max_bytes=HEATMAP_CACHE_BYTES, disk_dir=os.path.join(cache_dir, "heatmap") if cache_dir else None, disk_max_bytes=HEATMAP_DISK_BYTES)
+
+@functools.lru_cache(maxsize=None)
+def load_city_index():
+    """都市検索用のインデックスを作成する（環境変数 GAZETTEER_PATH があれば GeoNames 形式のファイルを読む）"""
+    gazetteer_path = os.environ.get("GAZETTEER_PATH")
+    if gazetteer_path:
+        return CityIndex.from_geonames(gazetteer_path)
+    return CityIndex.from_dict(WORLD_CITIES)
+
+
+# --- 日時の変換 ---
+def birth_datetime_utc(birth_date, birth_time, lon):
+    """出生日時（経度から求めた地方平均時）を UTC に変換する"""
+    birth_dt_local = datetime.datetime.combine(birth_date, birth_time)
+    tz_info = datetime.timezone(datetime.timedelta(hours=lon / 15.0))
+    return birth_dt_local.replace(tzinfo=tz_info).astimezone(datetime.timezone.utc)
+
+def transit_datetime_utc(transit_date):
+    """CCG の日付をその日の UTC 正午として扱う"""
+    return datetime.datetime.combine(transit_date, datetime.time(12, 0)).replace(tzinfo=datetime.timezone.utc)
+
+
+# --- 計算ロジック ---
+def calculate_acg_lines(calculation_dt_utc, selected_planets, n_lat_samples=DEFAULT_LAT_SAMPLES):
+    provider = load_ephemeris()
+    key_prefix = ("acg", provider.name, calculation_dt_utc.isoformat(), int(n_lat_samples))
+    def compute(planet_names):
+        return arrays_to_line_dict(compute_acg_arrays(provider, calculation_dt_utc, planet_names, n_lat_samples))
+    planet_names = [p for p in selected_planets if p in PLANET_NAMES]
+    return load_chart_cache().get_or_compute(key_prefix, planet_names, compute)
+
+def calculate_local_space_lines(birth_dt_utc, center_lat, center_lon, selected_planets):
+    provider = load_ephemeris()
+    key_prefix = ("local_space", provider.name, birth_dt_utc.isoformat(), round(float(center_lat), 6), round(float(center_lon), 6))
+    planet_names = [p for p in selected_planets if p in PLANET_NAMES]
+    return load_chart_cache().get_or_compute(key_prefix, planet_names, lambda missing: _local_space_lines(provider, birth_dt_utc, center_lat, center_lon, missing))
+
+def _local_space_lines(provider, birth_dt_utc, center_lat, center_lon, planet_names):
+    paths = compute_local_space(provider, birth_dt_utc, center_lat, center_lon, planet_names)
+    return {planet_name: {"lons": paths["lons"][0, i], "lats": paths["lats"][0, i]} for i, planet_name in enumerate(paths["planets"])}
+
+def calculate_local_space_for_centers(birth_dt_utc, centers, selected_planets):
+    """複数の中心地（{名前: (緯度, 経度)}）について、リロケーションした Local Space のラインをまとめて計算する"""
+    names = list(centers.keys())
+    coords = np.array([centers[name] for name in names], dtype=float).reshape(-1, 2)
+    paths = compute_local_space(load_ephemeris(), birth_dt_utc, coords[:, 0], coords[:, 1], selected_planets)
+    return {name: {planet_name: {"lons": paths["lons"][c, i], "lats": paths["lats"][c, i]} for i, planet_name in enumerate(paths["planets"])} for c, name in enumerate(names)}
+
+def find_cities_in_bands(acg_lines, selected_planets, orb=DEFAULT_ORB, city_index=None, with_distance=False):
+    """各惑星・アングルのライン（中心線から経度差 orb 度以内）にある都市を返す
+
+    with_distance=True の場合は (都市名, 経度差) のタプルを経度差の小さい順に返す。
+    """
+    if city_index is None:
+        city_index = load_city_index()
+    cities_by_planet_angle = {planet: {angle: [] for angle in ["AC", "DC", "IC", "MC"]} for planet in selected_planets}
+    for planet in selected_planets:
+        if planet not in acg_lines: continue
+        lines = acg_lines[planet]
+        for angle in ["MC", "IC", "AC", "DC"]:
+            line_data = lines.get(angle)
+            if not line_data: continue
+            if angle in ["MC", "IC"]:
+                if line_data.get("lon") is None: continue
+                idx, dist = city_index.query_meridian(line_data["lon"], orb)
+            else:
+                if len(line_data.get("lats", [])) == 0 or len(line_data.get("lons", [])) == 0: continue
+                idx, dist = city_index.query_curve(line_data["lats"], line_data["lons"], orb)
+            if with_distance:
+                order = np.argsort(dist, kind="stable")
+                cities_by_planet_angle[planet][angle] = [(city_index.names[i], float(d)) for i, d in zip(idx[order], dist[order])]
+            else:
+                cities_by_planet_angle[planet][angle] = city_index.names[idx].tolist()
+    return cities_by_planet_angle
+
+def calculate_crossings(acg_lines, selected_planets, n_lat_samples=None):
+    """異なる惑星の ACG ライン同士の交差（パラン）を緯度の昇順で返す（緯度グリッドは acg_lines から推定する）"""
+    arrays = line_dict_to_arrays(acg_lines, selected_planets, n_lat_samples)
+    return crossings_to_records(find_line_crossings(arrays), arrays["planets"])
+
+def calculate_heatmap(calculation_dt_utc, selected_planets, grid_step=DEFAULT_GRID_STEP, orb=DEFAULT_ORB, n_lat_samples=DEFAULT_LAT_SAMPLES):
+    """ACG ラインへの近さによる全球のスコア格子を返す（惑星ごとに計算してキャッシュし、合計する）"""
+    provider = load_ephemeris()
+    acg_lines = calculate_acg_lines(calculation_dt_utc, selected_planets, n_lat_samples)
+    key_prefix = ("heatmap", provider.name, calculation_dt_utc.isoformat(), int(n_lat_samples), float(grid_step), float(orb))
+    def compute(planet_names):
+        result = evaluate_heatmap(line_dict_to_arrays(acg_lines, planet_names, n_lat_samples), grid_step, orb)
+        return {planet_name: {"score": result["scores"][i]} for i, planet_name in enumerate(planet_names)}
+    per_planet = load_heatmap_cache().get_or_compute(key_prefix, list(acg_lines), compute)
+    lats, lons = make_grid(grid_step)
+    score = np.zeros((len(lats), len(lons)), dtype=np.float32)
+    for planet_scores in per_planet.values():
+        score += planet_scores["score"]
+    return {"lats": lats, "lons": lons, "score": score}
+
+# --- 描画・テキスト生成ロジック ---
+ANGLE_DASH = {"MC": "solid", "IC": "dash", "AC": "dot", "DC": "dashdot"}
+
+def plot_map(lines_data, map_type, selected_planets, render_mode="merged", group_by="planet", simplify_tolerance=DEFAULT_SIMPLIFY_TOLERANCE, crossings=None, heatmap=None):
+    """ライン群を地図に描画する
+
+    render_mode="traces" は惑星 × アングルごとに 1 トレース（従来の描画）。
+    render_mode="merged" はラインを NaN 区切りで結合して惑星ごと（group_by="angle" ならアングルごと）に
+    1 トレースにまとめ、simplify_tolerance（度）で間引いた float32 の配列を送る。ホバーには点ごとに「惑星-アングル」を出す。
+    crossings（calculate_crossings の戻り値）を渡すと交差点をマーカーで重ねる。
+    heatmap（calculate_heatmap の戻り値）を渡すと計算した格子のまま背景に描く（HEATMAP_MIN_DISPLAY_STEP 度より細かい格子は平均する）。
+    """
+    fig = go.Figure()
+    if heatmap is not None:
+        _add_heatmap_layer(fig, heatmap)
+    if render_mode == "traces":
+        fig.add_trace(go.Scattergeo(lon=[], lat=[], mode='lines', line=dict(width=1, color='gray'), showlegend=False))
+    groups = {}
+    for planet_jp in selected_planets:
+        if planet_jp not in lines_data: continue
+        planet_en = PLANET_INFO[planet_jp]["en"]
+        color = PLANET_INFO[planet_jp]["color"]
+        for angle, lons, lats in _map_polylines(lines_data[planet_jp], map_type):
+            label = f'{planet_en}-{angle}' if angle else f'{planet_en} Line'
+            if render_mode == "traces":
+                fig.add_trace(go.Scattergeo(lon=lons, lat=lats, mode='lines', line=dict(width=2, color=color), name=label, hoverinfo='name', connectgaps=False))
+                continue
+            lons, lats = simplify_polyline(lons, lats, simplify_tolerance)
+            if group_by == "angle" and angle:
+                key, name, line = angle, angle, dict(width=2, color='dimgray', dash=ANGLE_DASH[angle])
+            else:
+                key, name, line = planet_jp, planet_en, dict(width=2, color=color)
+            group = groups.setdefault(key, {"name": name, "line": line, "polylines": [], "labels": []})
+            group["polylines"].append((lons, lats))
+            group["labels"].append(label)
+    for group in groups.values():
+        lons, lats = merge_polylines(group["polylines"])
+        hovertext = merge_hovertext(group["polylines"], group["labels"])
+        fig.add_trace(go.Scattergeo(lon=lons.astype(np.float32), lat=lats.astype(np.float32), mode='lines', line=group["line"], name=group["name"], hovertext=hovertext, hoverinfo='text', connectgaps=False))
+    if crossings:
+        hover = [f'{PLANET_INFO[c["planets"][0]]["en"]}-{c["angles"][0]} × {PLANET_INFO[c["planets"][1]]["en"]}-{c["angles"][1]}<br>緯度 {c["lat"]:.1f}°' for c in crossings]
+        fig.add_trace(go.Scattergeo(lon=[c["lon"] for c in crossings], lat=[c["lat"] for c in crossings], mode='markers', marker=dict(size=6, color='black', symbol='x'), name='パラン（交差）', text=hover, hoverinfo='text'))
+    title_text = {"ACG": "アストロカートグラフィー (ACG)", "CCG": "サイクロカートグラフィー (CCG)", "Local Space": "ローカルスペース占星術 (Local Space)"}.get(map_type, "アストロマップ")
+    fig.update_layout(title_text=title_text, showlegend=True, geo=dict(projection_type='natural earth', showland=True, landcolor='rgb(243, 243, 243)', showocean=True, oceancolor='rgb(217, 237, 247)', showcountries=True, countrycolor='rgb(204, 204, 204)'), margin={"r":0,"t":40,"l":0,"b":0}, height=600)
+    return fig
+
+def _add_heatmap_layer(fig, heatmap):
+    step = heatmap["lats"][1] - heatmap["lats"][0]
+    factor = max(1, int(np.ceil(HEATMAP_MIN_DISPLAY_STEP / step - 1e-9)))
+    lats, lons, score = downsample(heatmap["lats"], heatmap["lons"], heatmap["score"], factor)
+    lon_grid, lat_grid = np.meshgrid(lons, lats)
+    # ほとんど影響のないセルは送らない
+    shown = score > score.max() * 0.05 if score.size and score.max() > 0 else np.zeros(score.shape, dtype=bool)
+    fig.add_trace(go.Scattergeo(
+        lon=lon_grid[shown].astype(np.float32), lat=lat_grid[shown].astype(np.float32), mode='markers', name='影響ヒートマップ', hoverinfo='skip',
+        marker=dict(color=score[shown], colorscale='YlOrRd', opacity=0.45, size=max(1.0, HEATMAP_PX_PER_DEG * step * factor), symbol='square', colorbar=dict(title='影響度', x=1.0, len=0.6)),
+    ))
+
+def _map_polylines(planet_lines, map_type):
+    """惑星 1 つ分のラインを (アングル, 経度配列, 緯度配列) の列で返す（±180 度をまたぐ箇所は NaN で区切る）"""
+    if map_type in ["ACG", "CCG"]:
+        for angle in ["MC", "IC", "AC", "DC"]:
+            line_data = planet_lines.get(angle)
+            if not line_data: continue
+            if angle in ["MC", "IC"]:
+                lon_val = line_data.get("lon")
+                if lon_val is None: continue
+                lons, lats = np.array([lon_val, lon_val], dtype=float), np.array([-LAT_LIMIT, LAT_LIMIT], dtype=float)
+            else:
+                lons, lats = line_data.get("lons", []), line_data.get("lats", [])
+            yield (angle, *split_at_antimeridian(lons, lats))
+    elif map_type == "Local Space":
+        yield (None, *split_at_antimeridian(planet_lines.get("lons", []), planet_lines.get("lats", [])))
+
+def format_full_report(birth_info, acg_cities, ccg_cities, transit_date, selected_planets, orb=DEFAULT_ORB, crossings=None):
+    report_lines = ["# アストロカートグラフィー総合鑑定レポート", "---", "## 鑑定対象者の情報"]
+    report_lines.append(f"- 生年月日: {birth_info['date']}")
+    report_lines.append(f"- 出生時刻: {birth_info['time']}")
+    report_lines.append(f"- 出生地: {birth_info['loc_name']} (緯度: {birth_info['lat']:.4f}, 経度: {birth_info['lon']:.4f})")
+    
+    def format_city_list(cities_data, planets):
+        lines = []
+        if not any(any(cities.values()) for cities in cities_data.values()):
+            lines.append(f"影響範囲内（±{orb:g}度）にリスト上の主要都市はありませんでした。")
+        else:
+            for planet in planets:
+                if planet in cities_data and any(cities_data[planet].values()):
+                    lines.append(f"\n### {planet}")
+                    for angle in ["AC", "DC", "MC", "IC"]:
+                        cities = cities_data[planet].get(angle, [])
+                        if cities:
+                            lines.append(f"- {angle}: " + ", ".join(sorted(cities)))
+        return lines
+
+    report_lines.extend(["\n---\n", "## 1. アストロカートグラフィー (ACG) - 生涯を通じた影響", f"影響を受ける主要都市リスト（中心線から±{orb:g}度の範囲）"])
+    report_lines.extend(format_city_list(acg_cities, selected_planets))
+    
+    report_lines.extend(["\n---\n", f"## 2. サイクロカートグラフィー (CCG) - {transit_date} 時点での影響", f"影響を受ける主要都市リスト（中心線から±{orb:g}度の範囲）"])
+    report_lines.extend(format_city_list(ccg_cities, selected_planets))
+
+    report_lines.extend(["\n---\n", "## 3. ローカルスペース占星術 - エネルギーの方位", "ローカルスペースは、特定の場所からの方位のエネルギーを示します。地図上の線は、各惑星のエネルギーが向かう方向を表しており、旅行や移転、インテリアの配置などで活用できます。"])
+    
+    report_lines.extend(["\n---\n", "## 4. 惑星とアングルの解説"])
+    for planet in selected_planets:
+        if planet in ARCHETYPE_INFO:
+            report_lines.append(f"\n### {planet}")
+            info = ARCHETYPE_INFO[planet]
+            report_lines.append(f"- 元型: {info['archetype']}")
+            report_lines.append(f"- AC (自己表現): {info['AC']}")
+            report_lines.append(f"- DC (人間関係): {info['DC']}")
+            report_lines.append(f"- MC (キャリア): {info['MC']}")
+            report_lines.append(f"- IC (家庭・基盤): {info['IC']}")
+
+    if crossings is not None:
+        report_lines.extend(["\n---\n", "## 5. パラン - ACG ラインの交差", "2 つの惑星のラインが交わる地点です。交点の緯度（パラン緯度）では、両惑星の影響が同時に強まります。"])
+        if not crossings:
+            report_lines.append("選択された惑星のライン同士の交差はありませんでした。")
+        for c in crossings:
+            report_lines.append(f"- {c['planets'][0]} {c['angles'][0]} × {c['planets'][1]} {c['angles'][1]}: 緯度 {c['lat']:.2f}度, 経度 {c['lon']:.2f}度")
+
+    return "\n".join(report_lines)
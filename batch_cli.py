@@ -0,0 +1,181 @@
+"""ヘッドレスのバッチ処理: 出生データの CSV / JSONL から鑑定レポートとマップを一括生成する
+
+入力の各行は以下の列（JSONL ではキー）を持つ。
+    date (YYYY-MM-DD), time (HH:MM), lat, lon は必須。
+    id, loc_name, transit_date (YYYY-MM-DD), planets（カンマ区切りの惑星名）は省略可。
+    id は出力ファイル名に使う。省略時、ファイル名に使えない文字を含む場合、他の行と重複する場合は
+    行番号から作った ID（row1, row2, ...）を使う。
+
+実行例:
+    python batch_cli.py clients.csv --out-dir reports --workers 8
+
+--figure-cache-dir（省略時は環境変数 CHART_CACHE_DIR の下の figures）を指定すると、作成した図を
+JSON でキャッシュし、同じ入力の図は作り直さずに読み込む。キャッシュは合計 --figure-cache-max-mb を超えると
+使われていない古いものから消す。
+"""
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import json
+import os
+import re
+import sys
+import time
+
+from astro_engine import DEFAULT_LAT_SAMPLES
+from astromap import (
+    PLANET_INFO, DEFAULT_ORB, load_ephemeris, load_city_index, birth_datetime_utc, transit_datetime_utc,
+    calculate_acg_lines, calculate_local_space_lines, calculate_crossings, find_cities_in_bands, plot_map, format_full_report,
+)
+from map_render import DEFAULT_FIGURE_CACHE_BYTES, DEFAULT_SIMPLIFY_TOLERANCE, figure_cache_path, load_or_build_figure, save_figure
+from profiling import StageTimer
+
+MAP_TYPES = {"acg": "ACG", "ccg": "CCG", "local_space": "Local Space"}
+FIGURE_FORMATS = ("html", "json", "png", "svg")
+# 出力ファイル名に使える ID（英数字・かな漢字などで始まり、区切り文字を含まない）
+_SAFE_ID = re.compile(r"\w[\w.-]{0,99}")
+
+
+def read_rows(path):
+    """CSV または JSONL（拡張子 .jsonl / .ndjson）から行を読み込む"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+def assign_row_ids(rows):
+    """各行の出力ファイル名に使う ID のリストと、id 列を使えなかった行の [(行番号, 元の id, 使う ID), ...] を返す"""
+    ids, replaced = [], []
+    candidates = [str(row.get("id") or "").strip() for row in rows]
+    # 行番号から作る ID は、どの行の id とも重ならないようにする
+    reserved, taken = set(candidates), set()
+    for index, candidate in enumerate(candidates):
+        if _SAFE_ID.fullmatch(candidate) and candidate not in taken:
+            row_id = candidate
+        else:
+            row_id = f"row{index + 1}"
+            while row_id in taken or row_id in reserved:
+                row_id += "_"
+            if candidate:
+                replaced.append((index + 1, candidate, row_id))
+        taken.add(row_id)
+        ids.append(row_id)
+    return ids, replaced
+
+
+def _init_worker():
+    # 天体暦と都市インデックスはワーカーごとに一度だけ読み込む
+    load_ephemeris()
+    load_city_index()
+
+
+def process_row(job):
+    """1 行分のレポートとマップを出力し、(行 ID, 段階ごとの所要時間, エラーメッセージ) を返す"""
+    row_id, row, options = job
+    timer = StageTimer()
+    try:
+        with timer.stage("入力の解析"):
+            birth_date = datetime.date.fromisoformat(row["date"])
+            birth_time = datetime.time.fromisoformat(row["time"])
+            lat, lon = float(row["lat"]), float(row["lon"])
+            transit_date = datetime.date.fromisoformat(row["transit_date"]) if row.get("transit_date") else datetime.date.today()
+            planets = [p.strip() for p in row["planets"].split(",")] if row.get("planets") else list(PLANET_INFO.keys())
+            birth_dt_utc = birth_datetime_utc(birth_date, birth_time, lon)
+            transit_dt_utc = transit_datetime_utc(transit_date)
+        with timer.stage("ACG"):
+            acg_lines = calculate_acg_lines(birth_dt_utc, planets, options["lat_samples"])
+        with timer.stage("パラン"):
+            acg_crossings = calculate_crossings(acg_lines, planets, options["lat_samples"])
+        with timer.stage("CCG"):
+            ccg_lines = calculate_acg_lines(transit_dt_utc, planets, options["lat_samples"])
+        with timer.stage("都市バンド"):
+            acg_cities = find_cities_in_bands(acg_lines, planets, options["orb"])
+            ccg_cities = find_cities_in_bands(ccg_lines, planets, options["orb"])
+        lines_by_map = {"acg": acg_lines, "ccg": ccg_lines}
+        if "local_space" in options["maps"]:
+            with timer.stage("Local Space"):
+                lines_by_map["local_space"] = calculate_local_space_lines(birth_dt_utc, lat, lon, planets)
+        with timer.stage("レポート"):
+            birth_info = {'date': birth_date.strftime('%Y-%m-%d'), 'time': birth_time.strftime('%H:%M'), 'loc_name': row.get("loc_name") or f"緯度:{lat}, 経度:{lon}", 'lat': lat, 'lon': lon}
+            report = format_full_report(birth_info, acg_cities, ccg_cities, transit_date, planets, options["orb"], acg_crossings)
+            with open(os.path.join(options["out_dir"], f"{row_id}_report.md"), "w", encoding="utf-8") as f:
+                f.write(report)
+        with timer.stage("マップ"):
+            chart_inputs = {"acg": (birth_dt_utc.isoformat(),), "ccg": (transit_dt_utc.isoformat(),), "local_space": (birth_dt_utc.isoformat(), lat, lon)}
+            for map_key in options["maps"]:
+                def build(map_key=map_key):
+                    return plot_map(lines_by_map[map_key], MAP_TYPES[map_key], planets, simplify_tolerance=DEFAULT_SIMPLIFY_TOLERANCE,
+                                    crossings=acg_crossings if map_key == "acg" else None)
+                if options["figure_cache_dir"]:
+                    key = (map_key, load_ephemeris().name, *chart_inputs[map_key], tuple(planets), options["lat_samples"], DEFAULT_SIMPLIFY_TOLERANCE)
+                    fig = load_or_build_figure(figure_cache_path(options["figure_cache_dir"], key), build, options["figure_cache_max_bytes"])
+                else:
+                    fig = build()
+                save_figure(fig, os.path.join(options["out_dir"], f"{row_id}_{map_key}.{options['figure_format']}"))
+        return row_id, timer.timings, None
+    except Exception as e:
+        return row_id, timer.timings, f"{type(e).__name__}: {e}"
+
+
+def run_batch(rows, options, workers):
+    """全行を処理し、(成功件数, 失敗した行のリスト, 合計の StageTimer, 経過秒) を返す"""
+    os.makedirs(options["out_dir"], exist_ok=True)
+    row_ids, _ = assign_row_ids(rows)
+    jobs = [(row_id, row, options) for row_id, row in zip(row_ids, rows)]
+    timer, failures = StageTimer(), []
+    start = time.perf_counter()
+    if workers <= 1:
+        _init_worker()
+        results = map(process_row, jobs)
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        results = executor.map(process_row, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+    try:
+        for row_id, timings, error in results:
+            timer.merge(timings)
+            if error:
+                failures.append((row_id, error))
+    finally:
+        if workers > 1:
+            executor.shutdown()
+    return len(jobs) - len(failures), failures, timer, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="出生データの一覧から鑑定レポートとマップを一括生成します。")
+    parser.add_argument("input", help="出生データの CSV または JSONL ファイル")
+    parser.add_argument("--out-dir", default="reports", help="出力先ディレクトリ（既定: reports）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="ワーカープロセス数（1 なら同一プロセスで実行）")
+    parser.add_argument("--maps", default="acg", help=f"出力するマップ（カンマ区切り: {', '.join(MAP_TYPES)}）")
+    parser.add_argument("--figure-format", choices=FIGURE_FORMATS, default="html", help="マップの出力形式（png/svg は kaleido が必要）")
+    parser.add_argument("--orb", type=float, default=DEFAULT_ORB, help="都市リストの影響範囲（度）")
+    parser.add_argument("--lat-samples", type=int, default=DEFAULT_LAT_SAMPLES, help="AC/DC ラインの緯度サンプル数")
+    cache_dir = os.environ.get("CHART_CACHE_DIR")
+    parser.add_argument("--figure-cache-dir", default=os.path.join(cache_dir, "figures") if cache_dir else None, help="図の JSON キャッシュの保存先（既定: $CHART_CACHE_DIR/figures。未設定ならキャッシュしない）")
+    parser.add_argument("--figure-cache-max-mb", type=float, default=DEFAULT_FIGURE_CACHE_BYTES / 1024 / 1024, help="図の JSON キャッシュの合計の上限（MB）")
+    args = parser.parse_args(argv)
+
+    maps = [m.strip() for m in args.maps.split(",") if m.strip()]
+    unknown = [m for m in maps if m not in MAP_TYPES]
+    if unknown:
+        parser.error(f"不明なマップです: {', '.join(unknown)}")
+    options = {"out_dir": args.out_dir, "maps": maps, "figure_format": args.figure_format, "orb": args.orb, "lat_samples": args.lat_samples, "figure_cache_dir": args.figure_cache_dir,
+               "figure_cache_max_bytes": int(args.figure_cache_max_mb * 1024 * 1024)}
+
+    rows = read_rows(args.input)
+    for line_no, original, row_id in assign_row_ids(rows)[1]:
+        print(f"[注意] {line_no} 行目の id {original!r} はファイル名に使えないか重複しているため、{row_id} として出力します", file=sys.stderr)
+    succeeded, failures, timer, elapsed_s = run_batch(rows, options, args.workers)
+    for row_id, error in failures:
+        print(f"[失敗] {row_id}: {error}", file=sys.stderr)
+    print(f"{succeeded}/{len(rows)} 件を {elapsed_s:.2f} 秒で生成しました（{succeeded / elapsed_s if elapsed_s else 0.0:.1f} 件/秒, ワーカー {args.workers}）")
+    print("段階ごとの所要時間（全ワーカーの合計）:")
+    for line in timer.format_lines(len(rows)):
+        print(f"  {line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
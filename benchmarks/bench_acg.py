@@ -0,0 +1,67 @@
+"""ACG ライン計算のマイクロベンチマーク（旧 Python ループ vs ベクトル化エンジン）
+
+実行: python benchmarks/bench_acg.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from astro_engine import acg_lines_from_radec, make_latitudes  # noqa: E402
+
+
+def legacy_acg_lines(ra_rad, dec_rad, gst_rad, latitudes):
+    """旧 calculate_acg_lines の緯度ループ（天体暦の観測部分を除いた参照実装）"""
+    lines = []
+    for p in range(len(ra_rad)):
+        lon_mc = np.degrees(ra_rad[p] - gst_rad)
+        lon_mc = (lon_mc + 180) % 360 - 180
+        lon_ic = (lon_mc + 180 + 180) % 360 - 180
+        ac_lons, dc_lons, ac_lats, dc_lats = [], [], [], []
+        for lat in latitudes:
+            lat_rad = np.radians(lat)
+            cos_lha_val = -np.tan(dec_rad[p]) * np.tan(lat_rad)
+            if -1 <= cos_lha_val <= 1:
+                lha_rad = np.arccos(cos_lha_val)
+                ac_lons.append((np.degrees(ra_rad[p] - lha_rad - gst_rad) + 180) % 360 - 180)
+                ac_lats.append(lat)
+                dc_lons.append((np.degrees(ra_rad[p] + lha_rad - gst_rad) + 180) % 360 - 180)
+                dc_lats.append(lat)
+        lines.append((lon_mc, lon_ic, ac_lons, ac_lats, dc_lons, dc_lats))
+    return lines
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(0)
+    n_planets = 10
+    ra_rad = rng.uniform(0, 2 * np.pi, n_planets)
+    dec_rad = np.radians(rng.uniform(-28, 28, n_planets))
+    gst_rad = 1.234
+
+    print(f"{'緯度サンプル':>12} {'旧ループ[ms]':>14} {'ベクトル化[ms]':>16} {'速度比':>8}")
+    for n_lat in (150, 1500, 15000):
+        latitudes = make_latitudes(n_lat)
+        # 結果が一致することを確認してから計測する
+        arrays = acg_lines_from_radec(ra_rad, dec_rad, gst_rad, latitudes)
+        for p, (_, _, ac_lons, _, dc_lons, _) in enumerate(legacy_acg_lines(ra_rad, dec_rad, gst_rad, latitudes)):
+            np.testing.assert_allclose(arrays["AC"][p][~np.isnan(arrays["AC"][p])], ac_lons, atol=1e-9)
+            np.testing.assert_allclose(arrays["DC"][p][~np.isnan(arrays["DC"][p])], dc_lons, atol=1e-9)
+        repeat = 3 if n_lat > 1500 else 10
+        t_loop = best_of(lambda: legacy_acg_lines(ra_rad, dec_rad, gst_rad, latitudes), repeat)
+        t_vec = best_of(lambda: acg_lines_from_radec(ra_rad, dec_rad, gst_rad, latitudes), repeat)
+        print(f"{n_lat:>12} {t_loop * 1e3:>14.3f} {t_vec * 1e3:>16.3f} {t_loop / t_vec:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
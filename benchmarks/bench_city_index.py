@@ -0,0 +1,109 @@
+"""都市バンド検索のベンチマーク（総当たり vs CityIndex）
+
+合成した地名辞典（1 万 / 10 万 / 100 万都市）に対して、10 天体 × 4 アングルの
+ラインにかかる都市を検索する。
+実行: python benchmarks/bench_city_index.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from astro_engine import acg_lines_from_radec, arrays_to_line_dict, make_latitudes, wrap_lon  # noqa: E402
+from city_index import DEFAULT_ORB, CityIndex  # noqa: E402
+
+# 旧実装の都市ごとの Python ループはこの件数までに限って計測する
+LOOP_LIMIT = 10_000
+
+
+def synthetic_gazetteer(n_cities, rng):
+    lats = np.degrees(np.arcsin(rng.uniform(-1, 1, n_cities))) * (85.0 / 90.0)
+    lons = rng.uniform(-180, 180, n_cities)
+    return np.arange(n_cities), lats, lons
+
+
+def synthetic_lines(rng):
+    arrays = acg_lines_from_radec(rng.uniform(0, 2 * np.pi, 10), np.radians(rng.uniform(-28, 28, 10)), 0.5, make_latitudes())
+    arrays["planets"] = list(range(10))
+    return arrays_to_line_dict(arrays)
+
+
+def loop_query(names, lats, lons, lines, orb):
+    """旧 find_cities_in_bands と同じ都市ごとのループ"""
+    hits = set()
+    for name, city_lat, city_lon in zip(names, lats, lons):
+        for planet, planet_lines in lines.items():
+            for angle in ["MC", "IC"]:
+                lon_diff = abs(city_lon - planet_lines[angle]["lon"])
+                if min(lon_diff, 360 - lon_diff) <= orb:
+                    hits.add((planet, angle, name))
+            for angle in ["AC", "DC"]:
+                line_data = planet_lines[angle]
+                if len(line_data["lats"]) == 0: continue
+                lon_diff = abs(city_lon - np.interp(city_lat, line_data["lats"], line_data["lons"]))
+                if min(lon_diff, 360 - lon_diff) <= orb:
+                    hits.add((planet, angle, name))
+    return hits
+
+
+def brute_force_query(names, lats, lons, lines, orb):
+    """全都市の距離を配列でまとめて計算する総当たり"""
+    hits = {}
+    for planet, planet_lines in lines.items():
+        for angle in ["MC", "IC"]:
+            dist = np.abs(wrap_lon(lons - planet_lines[angle]["lon"]))
+            hits[planet, angle] = names[dist <= orb]
+        for angle in ["AC", "DC"]:
+            line_data = planet_lines[angle]
+            if len(line_data["lats"]) == 0: continue
+            curve = np.degrees(np.unwrap(np.radians(line_data["lons"])))
+            in_span = (lats >= line_data["lats"][0]) & (lats <= line_data["lats"][-1])
+            dist = np.abs(wrap_lon(lons - np.interp(lats, line_data["lats"], curve)))
+            hits[planet, angle] = names[in_span & (dist <= orb)]
+    return hits
+
+
+def index_query(index, lines, orb):
+    hits = {}
+    for planet, planet_lines in lines.items():
+        for angle in ["MC", "IC"]:
+            idx, _ = index.query_meridian(planet_lines[angle]["lon"], orb)
+            hits[planet, angle] = index.names[idx]
+        for angle in ["AC", "DC"]:
+            if len(planet_lines[angle]["lats"]) == 0: continue
+            idx, _ = index.query_curve(planet_lines[angle]["lats"], planet_lines[angle]["lons"], orb)
+            hits[planet, angle] = index.names[idx]
+    return hits
+
+
+def as_set(hits):
+    return {(key, name) for key, found in hits.items() for name in found}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    rng = np.random.default_rng(0)
+    lines = synthetic_lines(rng)
+    print(f"{'都市数':>10} {'ループ[s]':>10} {'総当たり[s]':>12} {'索引構築[s]':>12} {'索引検索[s]':>12} {'ヒット数':>10}")
+    for n_cities in (10_000, 100_000, 1_000_000):
+        names, lats, lons = synthetic_gazetteer(n_cities, rng)
+        index, t_build = timed(CityIndex, names, lats, lons)
+        hits, t_index = timed(index_query, index, lines, DEFAULT_ORB)
+        brute, t_brute = timed(brute_force_query, names, lats, lons, lines, DEFAULT_ORB)
+        assert as_set(hits) == as_set(brute), "CityIndex の結果が総当たりと一致しません"
+        t_loop = "-"
+        if n_cities <= LOOP_LIMIT:
+            _, elapsed = timed(loop_query, names, lats, lons, lines, DEFAULT_ORB)
+            t_loop = f"{elapsed:.3f}"
+        print(f"{n_cities:>10} {t_loop:>10} {t_brute:>12.3f} {t_build:>12.3f} {t_index:>12.3f} {sum(map(len, hits.values())):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""ライン交差検出のベンチマーク（全ラインの組の総当たり vs 緯度区間のスイープ）
+
+10 天体 × 4 アングル（40 本）のラインについて、緯度サンプル数を増やしながら比較する。
+交差の数が緯度サンプル数によらず一定であること（折り返し点付近の交差を見落としていないこと）も確かめる。
+実行: python benchmarks/bench_crossings.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from astro_engine import acg_lines_from_radec, make_latitudes, wrap_lon  # noqa: E402
+from crossings import close_turning_points, find_line_crossings, line_matrix  # noqa: E402
+
+
+def pairwise_crossings(arrays):
+    """全ラインの組について、全区間の経度差の符号変化を調べる総当たり"""
+    arrays = close_turning_points(arrays)
+    lons, planet_idx, _ = line_matrix(arrays)
+    latitudes = arrays["latitudes"]
+    lats = []
+    for i in range(len(lons)):
+        for j in range(i + 1, len(lons)):
+            if planet_idx[i] == planet_idx[j]:
+                continue
+            d = wrap_lon(lons[i] - lons[j])
+            d0, d1 = d[:-1], d[1:]
+            with np.errstate(invalid='ignore'):
+                hit = (d0 * d1 < 0) & (np.abs(d1 - d0) < 180)
+            k = np.flatnonzero(hit)
+            t = d0[k] / (d0[k] - d1[k])
+            lats.append(latitudes[k] + t * (latitudes[k + 1] - latitudes[k]))
+    return np.sort(np.concatenate(lats)) if lats else np.empty(0)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    n_planets = 10
+    ra_rad, dec_rad = rng.uniform(0, 2 * np.pi, n_planets), np.radians(rng.uniform(-28, 28, n_planets))
+    counts = []
+    print(f"{'緯度サンプル':>10} {'総当たり[ms]':>14} {'スイープ[ms]':>14} {'交差数':>8}")
+    for n_lat in (150, 1500, 15000, 150000):
+        arrays = acg_lines_from_radec(ra_rad, dec_rad, 0.5, make_latitudes(n_lat))
+        arrays["planets"] = list(range(n_planets))
+        start = time.perf_counter()
+        expected = pairwise_crossings(arrays)
+        t_pairwise = time.perf_counter() - start
+        start = time.perf_counter()
+        crossings = find_line_crossings(arrays)
+        t_sweep = time.perf_counter() - start
+        np.testing.assert_allclose(crossings["lat"], expected, atol=1e-6)
+        counts.append(len(expected))
+        print(f"{n_lat:>10} {t_pairwise * 1e3:>14.1f} {t_sweep * 1e3:>14.1f} {len(expected):>8}")
+    assert len(set(counts)) == 1, f"交差の数が緯度サンプル数によって変わります: {counts}"
+
+
+if __name__ == "__main__":
+    main()
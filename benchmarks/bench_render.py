@@ -0,0 +1,45 @@
+"""地図描画のベンチマーク（惑星 × アングルごとのトレース vs 結合・簡略化したトレース）
+
+図の作成から JSON へのシリアライズ（ブラウザに送られるペイロード）までの時間と、
+ペイロードのサイズを比較する。
+実行: python benchmarks/bench_render.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from astro_engine import acg_lines_from_radec, arrays_to_line_dict, make_latitudes  # noqa: E402
+from astromap import PLANET_INFO, plot_map  # noqa: E402
+
+MODES = {
+    "従来（トレース分割）": {"render_mode": "traces"},
+    "結合（惑星ごと）": {"render_mode": "merged", "group_by": "planet"},
+    "結合（アングルごと）": {"render_mode": "merged", "group_by": "angle"},
+}
+
+
+def synthetic_lines(n_lat, rng):
+    planets = list(PLANET_INFO.keys())
+    arrays = acg_lines_from_radec(rng.uniform(0, 2 * np.pi, len(planets)), np.radians(rng.uniform(-28, 28, len(planets))), 0.5, make_latitudes(n_lat))
+    arrays["planets"] = planets
+    return arrays_to_line_dict(arrays), planets
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'緯度サンプル':>10}  {'描画モード':<16} {'トレース数':>8} {'ペイロード[KB]':>14} {'作成+JSON[ms]':>14}")
+    for n_lat in (150, 1500, 15000):
+        lines, planets = synthetic_lines(n_lat, rng)
+        for label, kwargs in MODES.items():
+            start = time.perf_counter()
+            fig = plot_map(lines, "ACG", planets, **kwargs)
+            payload = fig.to_json()
+            elapsed = time.perf_counter() - start
+            print(f"{n_lat:>10}  {label:<16} {len(fig.data):>8} {len(payload) / 1024:>14.1f} {elapsed * 1e3:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""チャート生成パイプライン全体のベンチマーク・スイート
+
+固定の出生・トランジットのデータと同梱の天体暦（ネットワーク不要）を使い、各段階を
+入力の規模（天体数・緯度サンプル数・都市数・日時数など）を変えて計測する。
+計測値は実時間（最良値）、ピークメモリ、呼び出しで確保されて戻り値として残ったブロック数と容量、
+戻り値を捨てた後も残るブロック数（キャッシュや参照の取り残しの検出用）。
+baseline.json と比較して、閾値を超えて遅く・重くなったケースを回帰として報告する。
+
+実行例:
+    python benchmarks/run_suite.py                     # 全ケースを計測してベースラインと比較
+    python benchmarks/run_suite.py --quick --check     # 最小規模のみ。回帰があれば終了コード 1
+    python benchmarks/run_suite.py --stages acg,heatmap
+    python benchmarks/run_suite.py --update-baseline   # 今回の結果をベースラインとして保存
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from astro_engine import arrays_to_line_dict, compute_acg_arrays, compute_acg_timeseries, compute_local_space  # noqa: E402
+from astromap import PLANET_INFO, WORLD_CITIES, birth_datetime_utc, find_cities_in_bands, format_full_report, plot_map  # noqa: E402
+from city_index import DEFAULT_ORB, CityIndex  # noqa: E402
+from crossings import crossings_to_records, find_line_crossings  # noqa: E402
+from ephemeris import get_provider  # noqa: E402
+from heatmap import evaluate_heatmap  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TIME_TOLERANCE = 0.5
+DEFAULT_MEMORY_TOLERANCE = 0.2
+# 数 ms の段階は揺らぎが大きいので、この差より小さい悪化は回帰とみなさない
+MIN_TIME_DELTA_MS = 10.0
+# 確保量もごく小さいケースは相対比が大きく振れるので、この差より小さい増加は回帰とみなさない。
+# ブロック数は小さなオブジェクト（辞書・タプル・文字列）の数で、内部のキャッシュや GC の時機で数百単位で揺れるため、
+# 記録はするが回帰の判定には容量（alloc_kib）だけを使う
+MIN_ALLOC_DELTA_KIB = 64.0
+# メモリの計測回数（各指標の最小値を採用して揺らぎを抑える）
+MEMORY_REPEAT = 3
+
+# 固定の入力（アプリの初期値と同じ出生データ）
+NATAL_DT_UTC = birth_datetime_utc(datetime.date(1976, 12, 25), datetime.time(16, 25), 127.68111)
+NATAL_LOCATION = (26.2125, 127.68111)
+TRANSIT_DT_UTC = datetime.datetime(2026, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+ALL_PLANETS = list(PLANET_INFO.keys())
+BIRTH_INFO = {'date': '1976-12-25', 'time': '16:25', 'loc_name': '沖縄県', 'lat': NATAL_LOCATION[0], 'lon': NATAL_LOCATION[1]}
+
+
+def _planets(n):
+    return ALL_PLANETS[:n]
+
+
+def _natal_arrays(n_planets=10, n_lat=150):
+    return compute_acg_arrays(get_provider(), NATAL_DT_UTC, _planets(n_planets), n_lat)
+
+
+def _synthetic_city_index(n_cities):
+    rng = np.random.default_rng(n_cities)
+    lats = np.degrees(np.arcsin(rng.uniform(-1, 1, n_cities))) * (85.0 / 90.0)
+    return CityIndex(np.array([f"city{i}" for i in range(n_cities)]), lats, rng.uniform(-180, 180, n_cities))
+
+
+# --- 段階ごとのケース ---
+# 各ケースは (ケース名, 規模のパラメータ, 準備関数, 計測対象の関数)。準備関数の戻り値が計測対象に渡される。
+def _cases():
+    cases = []
+    for n_planets in (1, 5, 10):
+        for n_lat in (150, 1500, 15000):
+            cases.append(("acg", {"planets": n_planets, "lat_samples": n_lat}, lambda p=n_planets, n=n_lat: (p, n),
+                          lambda args: arrays_to_line_dict(compute_acg_arrays(get_provider(), NATAL_DT_UTC, _planets(args[0]), args[1]))))
+    for n_dates in (24, 720, 8760):
+        cases.append(("ccg_timeseries", {"planets": 10, "dates": n_dates},
+                      lambda n=n_dates: [TRANSIT_DT_UTC + datetime.timedelta(hours=h) for h in range(n)],
+                      lambda dts: compute_acg_timeseries(get_provider(), dts, ALL_PLANETS, dtype=np.float32)))
+    for n_cities in (1_000, 10_000, 100_000):
+        cases.append(("city_bands", {"planets": 10, "cities": n_cities},
+                      lambda n=n_cities: (arrays_to_line_dict(_natal_arrays()), _synthetic_city_index(n)),
+                      lambda args: find_cities_in_bands(args[0], ALL_PLANETS, DEFAULT_ORB, city_index=args[1])))
+    for n_lat in (150, 1500, 15000):
+        cases.append(("crossings", {"planets": 10, "lat_samples": n_lat}, lambda n=n_lat: _natal_arrays(10, n),
+                      lambda arrays: crossings_to_records(find_line_crossings(arrays), arrays["planets"])))
+    for n_centers in (1, 100, 1000):
+        cases.append(("local_space", {"planets": 10, "centers": n_centers},
+                      lambda n=n_centers: (np.linspace(-60, 60, n), np.linspace(-179, 179, n)),
+                      lambda args: compute_local_space(get_provider(), NATAL_DT_UTC, args[0], args[1], ALL_PLANETS)))
+    for grid_step in (2.0, 1.0, 0.5):
+        cases.append(("heatmap", {"planets": 10, "grid_step": grid_step}, lambda g=grid_step: (_natal_arrays(), g),
+                      lambda args: evaluate_heatmap(args[0], args[1], workers=1)))
+    for n_planets in (1, 10):
+        for n_lat in (150, 15000):
+            cases.append(("plot_map", {"planets": n_planets, "lat_samples": n_lat},
+                          lambda p=n_planets, n=n_lat: (arrays_to_line_dict(_natal_arrays(p, n)), _planets(p)),
+                          lambda args: plot_map(args[0], "ACG", args[1]).to_json()))
+    for n_planets in (1, 10):
+        cases.append(("report", {"planets": n_planets}, lambda p=n_planets: _report_inputs(p),
+                      lambda args: format_full_report(BIRTH_INFO, *args)))
+    return cases
+
+
+def _report_inputs(n_planets):
+    planets = _planets(n_planets)
+    arrays = _natal_arrays(n_planets)
+    lines = arrays_to_line_dict(arrays)
+    ccg_lines = arrays_to_line_dict(compute_acg_arrays(get_provider(), TRANSIT_DT_UTC, planets))
+    index = CityIndex.from_dict(WORLD_CITIES)
+    crossings = crossings_to_records(find_line_crossings(arrays), arrays["planets"])
+    return (find_cities_in_bands(lines, planets, city_index=index), find_cities_in_bands(ccg_lines, planets, city_index=index), TRANSIT_DT_UTC.date(), planets, DEFAULT_ORB, crossings)
+
+
+def case_id(stage, params):
+    return stage + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+
+
+# --- 計測 ---
+def measure(setup, func, repeat):
+    """最良の実時間 wall_ms、ピークメモリ peak_kib、確保して残ったブロック数 alloc_blocks と容量 alloc_kib、
+    戻り値を捨てた後も残るブロック数 retained_blocks の辞書を返す（メモリの指標は MEMORY_REPEAT 回の最小値）"""
+    args = setup()
+    func(args)  # ウォームアップ（遅延インポートや初回のファイル読み込みを除く）
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(args)
+        best = min(best, time.perf_counter() - start)
+    # メモリはトレースが遅いので、時間とは別に計測する
+    memory = []
+    for _ in range(MEMORY_REPEAT):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        result = func(args)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated = tracemalloc.take_snapshot().compare_to(before, "filename")
+        alloc_blocks, alloc_bytes = sum(stat.count_diff for stat in allocated), sum(stat.size_diff for stat in allocated)
+        # 戻り値を捨てた後も残るブロックは、キャッシュや参照の取り残しによるもの
+        del result, allocated
+        gc.collect()
+        retained_blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+        tracemalloc.stop()
+        memory.append((peak, alloc_blocks, alloc_bytes, retained_blocks))
+    peak, alloc_blocks, alloc_bytes, retained_blocks = (min(values) for values in zip(*memory))
+    return {
+        "wall_ms": round(best * 1e3, 3),
+        "peak_kib": round(peak / 1024, 1),
+        "alloc_blocks": alloc_blocks,
+        "alloc_kib": round(alloc_bytes / 1024, 1),
+        "retained_blocks": retained_blocks,
+    }
+
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    """ベースラインより閾値を超えて悪化したケースのリストを返す"""
+    regressions = []
+    for cid, current in results.items():
+        base = baseline.get(cid)
+        if not base:
+            continue
+        if current["wall_ms"] > base["wall_ms"] * (1 + time_tolerance) and current["wall_ms"] - base["wall_ms"] > MIN_TIME_DELTA_MS:
+            regressions.append((cid, "wall_ms", base["wall_ms"], current["wall_ms"]))
+        if current["peak_kib"] > base["peak_kib"] * (1 + memory_tolerance):
+            regressions.append((cid, "peak_kib", base["peak_kib"], current["peak_kib"]))
+        if "alloc_kib" in base and current["alloc_kib"] > base["alloc_kib"] * (1 + memory_tolerance) and current["alloc_kib"] - base["alloc_kib"] > MIN_ALLOC_DELTA_KIB:
+            regressions.append((cid, "alloc_kib", base["alloc_kib"], current["alloc_kib"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="チャート生成パイプラインのベンチマーク")
+    parser.add_argument("--stages", help="計測する段階（カンマ区切り。既定: 全段階）")
+    parser.add_argument("--quick", action="store_true", help="各段階の最小規模のケースだけを計測する")
+    parser.add_argument("--repeat", type=int, default=5, help="実時間の計測回数（最良値を採用）")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="ベースラインの JSON ファイル")
+    parser.add_argument("--update-baseline", action="store_true", help="今回の結果でベースラインを上書きする")
+    parser.add_argument("--check", action="store_true", help="回帰があれば終了コード 1 で終わる")
+    parser.add_argument("--time-tolerance", type=float, default=DEFAULT_TIME_TOLERANCE, help="実時間の許容悪化率（既定: 0.5 = 50%%）")
+    parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE, help="ピークメモリと確保量の許容悪化率（既定: 0.2 = 20%%）")
+    args = parser.parse_args(argv)
+
+    stages = set(args.stages.split(",")) if args.stages else None
+    provider = get_provider()
+    print(f"天体暦: {provider.name}（起動 {provider.stats.cold_start_s * 1e3:.1f} ms）, Python {platform.python_version()}, NumPy {np.__version__}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["cases"]
+
+    results, seen_stages = {}, set()
+    print(f"{'ケース':<48} {'時間[ms]':>10} {'ピーク[KiB]':>12} {'確保ブロック':>12} {'確保[KiB]':>10} {'残存ブロック':>12} {'基準比':>8}")
+    for stage, params, setup, func in _cases():
+        if stages and stage not in stages:
+            continue
+        if args.quick and stage in seen_stages:
+            continue
+        seen_stages.add(stage)
+        cid = case_id(stage, params)
+        m = results[cid] = measure(setup, func, args.repeat)
+        ratio = f"{m['wall_ms'] / baseline[cid]['wall_ms']:.2f}x" if cid in baseline else "-"
+        print(f"{cid:<48} {m['wall_ms']:>10.2f} {m['peak_kib']:>12.1f} {m['alloc_blocks']:>12} {m['alloc_kib']:>10.1f} {m['retained_blocks']:>12} {ratio:>8}")
+
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    for cid, metric, before, after in regressions:
+        print(f"[回帰] {cid} の {metric}: {before} -> {after}")
+    if args.update_baseline:
+        merged = {**baseline, **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(), "ephemeris": provider.name},
+                       "cases": dict(sorted(merged.items()))}, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        print(f"ベースラインを更新しました: {args.baseline}")
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
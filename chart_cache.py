@@ -0,0 +1,217 @@
+"""惑星ごとの計算結果のキャッシュ（メモリ上の LRU と任意のディスク層）"""
+import collections
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_DISK_MAX_BYTES = 1024 * 1024 * 1024
+# 上限を超えたら、合計がこの割合になるまで古いファイルを消す（毎回の書き込みで掃除しないため）
+_DISK_PRUNE_RATIO = 0.9
+
+
+class ChartCache:
+    """キー（タプル）ごとに惑星 1 つ分の計算結果を保持する LRU キャッシュ
+
+    値は float / ndarray を葉に持つ入れ子の辞書（例: {"AC": {"lons": ..., "lats": ...}, "MC": {"lon": ...}}）。
+    max_entries 件、または max_bytes（配列の合計バイト数）を超えると古いものから捨てる。
+    disk_dir を指定すると NPZ ファイルとしても保存し、再起動後や別のワーカープロセスからも読める。
+    ディスク上のファイルは合計 disk_max_bytes（None なら無制限）を超えると、更新時刻の古い順に消す
+    （読み込んだファイルは更新時刻を新しくするので、最近使われていないものから消える）。
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None, disk_dir=None, disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_files())
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._entries = collections.OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """キャッシュされた値を返す（無ければ None）"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = self._load_from_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        self._save_to_disk(key, value)
+
+    def get_or_compute(self, key_prefix, planet_names, compute):
+        """惑星ごとにキャッシュを引き、足りない惑星だけ compute(不足分の惑星リスト) でまとめて計算する
+
+        キーは key_prefix + (惑星名,)。戻り値は planet_names の順に並んだ {惑星名: 値}。
+        """
+        results, missing = {}, []
+        for planet_name in planet_names:
+            value = self.get(key_prefix + (planet_name,))
+            if value is None:
+                missing.append(planet_name)
+            else:
+                results[planet_name] = value
+        if missing:
+            for planet_name, value in compute(missing).items():
+                self.put(key_prefix + (planet_name,), value)
+                results[planet_name] = value
+        return {p: results[p] for p in planet_names if p in results}
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_bytes": self._disk_bytes,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    # --- 内部処理 ---
+    def _store(self, key, value):
+        if key in self._entries:
+            self._total_bytes -= self._sizes[key]
+        size = _nbytes(value)
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._sizes[key] = size
+        self._total_bytes += size
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or (self.max_bytes is not None and self._total_bytes > self.max_bytes)):
+            old_key, _ = self._entries.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(old_key)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.npz")
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                value = _unflatten({name: data[name] for name in data.files})
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def _save_to_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        # 別プロセスが読みかけのファイルを壊さないよう、一時ファイルに書いてから置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **_flatten(value))
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._disk_bytes += size
+            over_limit = self.disk_max_bytes is not None and self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._prune_disk()
+
+    def _disk_files(self):
+        """ディスク層の (更新時刻, パス, バイト数) のリスト（他のプロセスが同時に消したファイルは除く）"""
+        files = []
+        with os.scandir(self.disk_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".npz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        return files
+
+    def _prune_disk(self):
+        # 他のプロセスも同じディレクトリに書くので、合計はディレクトリを数え直して求める
+        files = sorted(self._disk_files())
+        total = sum(size for _, _, size in files)
+        target = self.disk_max_bytes * _DISK_PRUNE_RATIO
+        removed = 0
+        for _, path, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_bytes = total
+            self.disk_evictions += removed
+
+
+def _flatten(value, prefix=""):
+    flat = {}
+    for name, item in value.items():
+        if isinstance(item, dict):
+            flat.update(_flatten(item, f"{prefix}{name}/"))
+        else:
+            flat[f"{prefix}{name}"] = np.asarray(item)
+    return flat
+
+
+def _unflatten(flat):
+    value = {}
+    for path, array in flat.items():
+        *parents, name = path.split("/")
+        node = value
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[name] = array.item() if array.ndim == 0 else array
+    return value
+
+
+def _nbytes(value):
+    if isinstance(value, dict):
+        return sum(_nbytes(item) for item in value.values())
+    return np.asarray(value).nbytes
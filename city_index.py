@@ -0,0 +1,133 @@
+"""緯度・経度グリッドでバケット化した都市ストア（大規模な地名辞典向け）"""
+import numpy as np
+import pandas as pd
+
+from astro_engine import wrap_lon
+
+DEFAULT_ORB = 5.0
+DEFAULT_CELL_SIZE = 1.0
+
+# GeoNames のダンプ（allCountries.txt, cities500.txt など）の列番号
+_GEONAMES_COLUMNS = {"name": 1, "lat": 4, "lon": 5, "population": 14}
+
+
+class CityIndex:
+    """都市の緯度・経度を配列で保持し、セル単位でバンド検索を行う
+
+    都市は (緯度セル, 経度セル) の順に並べ替えて格納し、各セルの開始位置を
+    `cell_starts` に持つ。1 つの緯度行の中では経度セルが連続するため、
+    経度範囲の検索は緯度行ごとに 1〜2 個のスライスで済む。
+    """
+
+    def __init__(self, names, lats, lons, cell_size=DEFAULT_CELL_SIZE):
+        lats = np.asarray(lats, dtype=float)
+        lons = wrap_lon(np.asarray(lons, dtype=float))
+        self.n_lat_cells = max(1, int(round(180.0 / cell_size)))
+        self.n_lon_cells = max(1, int(round(360.0 / cell_size)))
+        self.lat_step = 180.0 / self.n_lat_cells
+        self.lon_step = 360.0 / self.n_lon_cells
+
+        cell_ids = self._lat_cell(lats) * self.n_lon_cells + self._lon_cell(lons)
+        order = np.argsort(cell_ids, kind="stable")
+        self.names = np.asarray(names, dtype=object)[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        n_cells = self.n_lat_cells * self.n_lon_cells
+        self.cell_starts = np.searchsorted(cell_ids[order], np.arange(n_cells + 1))
+
+    @classmethod
+    def from_dict(cls, cities, cell_size=DEFAULT_CELL_SIZE):
+        """{都市名: (緯度, 経度)} の辞書から作成する"""
+        names = list(cities.keys())
+        coords = np.array([cities[name] for name in names], dtype=float).reshape(-1, 2)
+        return cls(names, coords[:, 0], coords[:, 1], cell_size)
+
+    @classmethod
+    def from_geonames(cls, path, min_population=0, cell_size=DEFAULT_CELL_SIZE):
+        """GeoNames 形式（タブ区切り）のローカルファイルから作成する"""
+        usecols = sorted(_GEONAMES_COLUMNS.values())
+        df = pd.read_csv(path, sep="\t", header=None, usecols=usecols, quoting=3, dtype={1: str}, keep_default_na=False)
+        if min_population > 0:
+            df = df[df[_GEONAMES_COLUMNS["population"]] >= min_population]
+        return cls(df[_GEONAMES_COLUMNS["name"]].to_numpy(), df[_GEONAMES_COLUMNS["lat"]].to_numpy(), df[_GEONAMES_COLUMNS["lon"]].to_numpy(), cell_size)
+
+    def __len__(self):
+        return len(self.lats)
+
+    # --- 検索 ---
+    def query_meridian(self, lon, orb=DEFAULT_ORB):
+        """MC/IC の子午線から経度差 orb 度以内の都市を返す
+
+        戻り値は (都市インデックス, 経度差[度]) の配列の組。
+        """
+        rows = np.arange(self.n_lat_cells)
+        candidates = self._candidates(rows, np.full(len(rows), lon - orb), np.full(len(rows), lon + orb))
+        distances = np.abs(wrap_lon(self.lons[candidates] - lon))
+        hit = distances <= orb
+        return candidates[hit], distances[hit]
+
+    def query_curve(self, lats, lons, orb=DEFAULT_ORB):
+        """AC/DC の曲線から、都市の緯度における経度差が orb 度以内の都市を返す
+
+        lats は昇順の緯度、lons は対応する経度（±180 度で折り返していてよい）。
+        曲線が存在する緯度範囲の外にある都市は対象外。
+        """
+        lats = np.asarray(lats, dtype=float)
+        if len(lats) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        unwrapped = np.degrees(np.unwrap(np.radians(np.asarray(lons, dtype=float))))
+        lat_min, lat_max = lats[0], lats[-1]
+
+        # 各緯度行に含まれる曲線の経度範囲（行の上下端と行内のサンプル点の最小・最大）
+        rows = np.arange(self._lat_cell(lat_min), self._lat_cell(lat_max) + 1)
+        row_lo = np.clip(rows * self.lat_step - 90.0, lat_min, lat_max)
+        row_hi = np.clip((rows + 1) * self.lat_step - 90.0, lat_min, lat_max)
+        edge_lo, edge_hi = np.interp(row_lo, lats, unwrapped), np.interp(row_hi, lats, unwrapped)
+        lon_min, lon_max = np.minimum(edge_lo, edge_hi), np.maximum(edge_lo, edge_hi)
+        sample_rows = self._lat_cell(lats) - rows[0]
+        np.minimum.at(lon_min, sample_rows, unwrapped)
+        np.maximum.at(lon_max, sample_rows, unwrapped)
+
+        candidates = self._candidates(rows, lon_min - orb, lon_max + orb)
+        cand_lats = self.lats[candidates]
+        in_span = (cand_lats >= lat_min) & (cand_lats <= lat_max)
+        candidates = candidates[in_span]
+        center = np.interp(self.lats[candidates], lats, unwrapped)
+        distances = np.abs(wrap_lon(self.lons[candidates] - center))
+        hit = distances <= orb
+        return candidates[hit], distances[hit]
+
+    # --- 内部処理 ---
+    def _lat_cell(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90.0) / self.lat_step).astype(np.intp), 0, self.n_lat_cells - 1)
+
+    def _lon_cell(self, lon):
+        return np.clip(np.floor((np.asarray(lon) + 180.0) / self.lon_step).astype(np.intp), 0, self.n_lon_cells - 1)
+
+    def _candidates(self, rows, lon_lo, lon_hi):
+        """緯度行ごとの経度範囲 [lon_lo, lon_hi]（折り返し前の値）に含まれるセルの都市インデックス"""
+        n = self.n_lon_cells
+        c_lo = np.floor((lon_lo + 180.0) / self.lon_step).astype(np.intp)
+        c_hi = np.floor((lon_hi + 180.0) / self.lon_step).astype(np.intp)
+        full = (c_hi - c_lo + 1) >= n
+        a, b = np.where(full, 0, c_lo % n), np.where(full, n - 1, c_hi % n)
+        wrapped = a > b
+        # 折り返す範囲は [a, n-1] と [0, b] の 2 区間に分ける
+        seg_rows = np.concatenate([rows, rows[wrapped]])
+        seg_a = np.concatenate([a, np.zeros(wrapped.sum(), dtype=np.intp)])
+        seg_b = np.concatenate([np.where(wrapped, n - 1, b), b[wrapped]])
+        starts = self.cell_starts[seg_rows * n + seg_a]
+        ends = self.cell_starts[seg_rows * n + seg_b + 1]
+        return _ranges_to_indices(starts, ends)
+
+
+def _ranges_to_indices(starts, ends):
+    """[starts[i], ends[i]) の区間を連結したインデックス配列を作る"""
+    lengths = ends - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.intp)
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return np.arange(total, dtype=np.intp) + offsets
@@ -0,0 +1,115 @@
+"""マップ計算のバックグラウンド実行（セッション間で共有するスレッドプールと、同一リクエストの重複排除）
+
+app.py は 3 つのマップ（ACG / CCG / Local Space）をここに投入し、終わったものから順に描画する。
+スレッドで実行するのは、計算結果のキャッシュ（ChartCache）と天体暦をプロセス内で共有するため
+（重い処理は NumPy / Swiss Ephemeris の中で GIL を解放する）。
+"""
+import concurrent.futures
+import functools
+import threading
+
+from astromap import (
+    calculate_acg_lines, calculate_crossings, calculate_heatmap, calculate_local_space_lines, find_cities_in_bands, plot_map,
+)
+from profiling import StageTimer
+
+
+class ComputeService:
+    """同じキーの計算を 1 つの Future にまとめて実行するスレッドプール
+
+    submit() は待機中・実行中の同じキーの計算があればその Future を返し、参照数を増やす。
+    release() で参照を外し、誰も待たなくなった未開始の計算は取り消す
+    （開始済みの計算はスレッドを止められないので最後まで実行され、結果はキャッシュに残る）。
+    """
+
+    def __init__(self, max_workers=None):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="astromap")
+        # Future.cancel() は完了時のコールバックを同じスレッドで呼ぶので、再入可能なロックにする
+        self._lock = threading.RLock()
+        self._inflight = {}
+        self._refcounts = {}
+        self.submitted = 0
+        self.deduplicated = 0
+        self.cancelled = 0
+
+    def submit(self, key, fn, *args, **kwargs):
+        """key（ハッシュ可能な入力の組）の計算 fn(*args, **kwargs) を投入し、その Future を返す"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._refcounts[key] += 1
+                self.deduplicated += 1
+                return future
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._inflight[key] = future
+            self._refcounts[key] = 1
+            self.submitted += 1
+        future.add_done_callback(functools.partial(self._forget, key))
+        return future
+
+    def release(self, keys):
+        """呼び出し側がもう結果を待たないキーの参照を外す（完了済みのキーは無視する）"""
+        with self._lock:
+            for key in keys:
+                if key not in self._refcounts:
+                    continue
+                self._refcounts[key] -= 1
+                if self._refcounts[key] <= 0 and self._inflight[key].cancel():
+                    self.cancelled += 1
+
+    def stats(self):
+        with self._lock:
+            return {"inflight": len(self._inflight), "submitted": self.submitted, "deduplicated": self.deduplicated, "cancelled": self.cancelled}
+
+    def _forget(self, key, future):
+        # 完了した計算は次のリクエストから外す（以降はキャッシュから結果を返す）
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                del self._refcounts[key]
+
+
+@functools.lru_cache(maxsize=None)
+def get_compute_service():
+    """プロセス内で共有する ComputeService を返す（全セッションで同じ実行器を使う）"""
+    return ComputeService()
+
+
+# --- マップごとの計算 ---
+# 戻り値は "figure" と、段階ごとの所要時間 "timings" を持つ辞書。セッション間で共有されるので、呼び出し側で変更しない。
+def build_acg_map(birth_dt_utc, selected_planets, orb, heatmap_grid_step=None):
+    """ACG のライン・パラン・（指定があれば）ヒートマップ・図・都市バンドを計算する"""
+    timer = StageTimer()
+    with timer.stage("ACG ライン"):
+        lines = calculate_acg_lines(birth_dt_utc, selected_planets)
+    with timer.stage("パラン"):
+        crossings = calculate_crossings(lines, selected_planets)
+    heatmap = None
+    if heatmap_grid_step:
+        with timer.stage("ヒートマップ"):
+            heatmap = calculate_heatmap(birth_dt_utc, selected_planets, heatmap_grid_step, orb)
+    with timer.stage("マップ描画"):
+        figure = plot_map(lines, "ACG", selected_planets, crossings=crossings, heatmap=heatmap)
+    with timer.stage("都市バンド"):
+        cities = find_cities_in_bands(lines, selected_planets, orb)
+    return {"lines": lines, "crossings": crossings, "figure": figure, "cities": cities, "timings": timer.timings}
+
+def build_ccg_map(transit_dt_utc, selected_planets, orb):
+    """CCG のライン・図・都市バンドを計算する"""
+    timer = StageTimer()
+    with timer.stage("CCG ライン"):
+        lines = calculate_acg_lines(transit_dt_utc, selected_planets)
+    with timer.stage("マップ描画"):
+        figure = plot_map(lines, "CCG", selected_planets)
+    with timer.stage("都市バンド"):
+        cities = find_cities_in_bands(lines, selected_planets, orb)
+    return {"lines": lines, "figure": figure, "cities": cities, "timings": timer.timings}
+
+def build_local_space_map(birth_dt_utc, center_lat, center_lon, selected_planets):
+    """出生地を中心とする Local Space のラインと図を計算する"""
+    timer = StageTimer()
+    with timer.stage("Local Space"):
+        lines = calculate_local_space_lines(birth_dt_utc, center_lat, center_lon, selected_planets)
+    with timer.stage("マップ描画"):
+        figure = plot_map(lines, "Local Space", selected_planets)
+    return {"lines": lines, "figure": figure, "timings": timer.timings}
@@ -0,0 +1,168 @@
+"""ACG ラインの交差（パラン）検出
+
+全惑星の AC/DC/MC/IC ラインは共通の緯度グリッド上の経度として与えられるので、
+隣り合う 2 つの緯度の間（区間）ごとにラインを経度順に並べ、上端と下端で順序が入れ替わった
+ラインの組を交差とみなす。並べ替えは全区間まとめて行い、順序が入れ替わった区間の、
+入れ替わりが起きたブロックの中だけで組を調べる。
+AC/DC ラインは、グリッドの最後の標本から折り返し点（AC と DC が MC/IC 上で合流する緯度）までの
+区間で経度が大きく動くので、検出の前に折り返し点までラインを延ばしておく。
+"""
+import numpy as np
+
+from astro_engine import ANGLES, acg_lines_from_radec, wrap_lon
+
+# 経度 ±180 度をまたぐ交差を拾うため、各ラインを -360 / 0 / +360 度ずらした複製と比較する
+_SHIFTS = (-360.0, 0.0, 360.0)
+# 折り返し点とその手前に挿入する緯度（折り返し点からの距離をグリッド間隔に対する割合で表す）。
+# 折り返し点の近くでは経度が距離の平方根に比例して動くので、手前を密にとる
+_TURN_OFFSETS = (0.0, 0.05, 0.2, 0.5)
+
+
+def line_matrix(arrays):
+    """配列形式の ACG ラインを (ライン数, 緯度数) の経度行列にまとめる
+
+    戻り値は (経度行列, 惑星インデックス, アングルインデックス)。ラインは ANGLES の順に惑星を並べる。
+    """
+    n_planets, n_lat = len(arrays["planets"]), len(arrays["latitudes"])
+    rows, planet_idx, angle_idx = [], [], []
+    for a, angle in enumerate(ANGLES):
+        values = np.asarray(arrays[angle], dtype=float)
+        rows.append(np.broadcast_to(values[:, None], (n_planets, n_lat)) if values.ndim == 1 else values)
+        planet_idx.append(np.arange(n_planets))
+        angle_idx.append(np.full(n_planets, a))
+    return np.vstack(rows), np.concatenate(planet_idx), np.concatenate(angle_idx)
+
+
+def find_line_crossings(arrays):
+    """異なる惑星のライン同士の交差をすべて求める
+
+    arrays は astro_engine.compute_acg_arrays の戻り値と同じ形式。
+    戻り値は "planet_a", "angle_a", "planet_b", "angle_b"（惑星・ANGLES のインデックス）と
+    "lat", "lon"（度）の配列を持つ辞書で、緯度の昇順に並ぶ。
+    """
+    arrays = close_turning_points(arrays)
+    lons, planet_idx, angle_idx = line_matrix(arrays)
+    latitudes = np.asarray(arrays["latitudes"], dtype=float)
+    n_lines = len(lons)
+
+    # 区間ごとの始点と（始点からの折り返しを解いた）終点
+    start = lons[:, :-1]
+    with np.errstate(invalid='ignore'):
+        end = start + wrap_lon(lons[:, 1:] - start)
+    valid = np.isfinite(start) & np.isfinite(end)
+
+    # 複製を含めて区間ごとに始点の経度順に並べ、終点の順序が崩れている区間だけを調べる
+    n_shift = len(_SHIFTS)
+    shift = np.repeat(_SHIFTS, n_lines)[:, None]
+    seg_start = np.where(np.tile(valid, (n_shift, 1)), np.tile(start, (n_shift, 1)) + shift, np.inf).T
+    seg_end = np.where(np.tile(valid, (n_shift, 1)), np.tile(end, (n_shift, 1)) + shift, np.inf).T
+    order = np.argsort(seg_start, axis=1, kind="stable")
+    ends_in_order = np.take_along_axis(seg_end, order, axis=1)
+    with np.errstate(invalid='ignore'):
+        disordered = np.flatnonzero(np.any(np.diff(ends_in_order, axis=1) < 0, axis=1))
+
+    found = []
+    for k in disordered:
+        line_order = order[k]
+        for block in _inversion_blocks(ends_in_order[k]):
+            members = line_order[block]
+            found.extend(_block_crossings(k, members % n_lines, members, seg_start[k], seg_end[k], planet_idx))
+
+    if not found:
+        empty_i, empty_f = np.empty(0, dtype=np.intp), np.empty(0)
+        return {"planet_a": empty_i, "angle_a": empty_i, "planet_b": empty_i, "angle_b": empty_i, "lat": empty_f, "lon": empty_f}
+    k, line_a, line_b, t, lon = (np.array(v) for v in zip(*found))
+    lat = latitudes[k] + t * (latitudes[k + 1] - latitudes[k])
+    order = np.argsort(lat, kind="stable")
+    line_a, line_b = line_a[order], line_b[order]
+    return {
+        "planet_a": planet_idx[line_a], "angle_a": angle_idx[line_a],
+        "planet_b": planet_idx[line_b], "angle_b": angle_idx[line_b],
+        "lat": lat[order], "lon": lon[order],
+    }
+
+
+def close_turning_points(arrays):
+    """AC/DC ラインを折り返し点（緯度 ±(90 − |赤緯|)）まで延ばした配列形式のラインを返す
+
+    赤緯は MC と AC の経度差（時角 H）から cos H = −tan δ tan φ で逆算し、折り返し点と
+    その手前の緯度をグリッドに挿入して全ラインを計算し直す。折り返し点では AC と DC が
+    MC（cos H = 1）または IC（cos H = −1）の経度で合流する。
+    """
+    latitudes = np.asarray(arrays["latitudes"], dtype=float)
+    if len(latitudes) < 2:
+        return arrays
+    mc = np.asarray(arrays["MC"], dtype=float)
+    dec = _declinations(latitudes, mc, np.asarray(arrays["AC"], dtype=float))
+    step = latitudes[1] - latitudes[0]
+    turns = np.abs(90.0 - np.abs(dec))
+    extra = [sign * (turn - offset * step) for turn in turns[np.isfinite(turns)] for sign in (1.0, -1.0) for offset in _TURN_OFFSETS]
+    extra = [lat for lat in extra if latitudes[0] < lat < latitudes[-1]]
+    if not extra:
+        return arrays
+    new_latitudes = np.union1d(latitudes, extra)
+    lines = acg_lines_from_radec(np.radians(mc), np.radians(dec), 0.0, new_latitudes)
+    for p, turn in enumerate(turns):
+        for sign in (1.0, -1.0):
+            row = np.flatnonzero(new_latitudes == sign * turn)
+            if len(row):
+                # 丸め誤差で |cos H| が 1 をわずかに超えて NaN になるのを避け、合流点の経度を直接入れる
+                joined = mc[p] if -np.sign(dec[p]) * sign > 0 else wrap_lon(mc[p] + 180.0)
+                lines["AC"][p, row], lines["DC"][p, row] = joined, joined
+    return {**arrays, "latitudes": new_latitudes, "AC": lines["AC"], "DC": lines["DC"], "MC": lines["MC"], "IC": lines["IC"]}
+
+
+def _declinations(latitudes, mc, ac):
+    """各惑星の赤緯（度）を、AC ラインの最も高緯度の標本から逆算する（標本が無ければ NaN）"""
+    dec = np.full(len(mc), np.nan)
+    for p in range(len(mc)):
+        valid = np.flatnonzero(np.isfinite(ac[p]) & (latitudes != 0.0))
+        if len(valid):
+            k = valid[np.argmax(np.abs(latitudes[valid]))]
+            hour_angle = np.radians(mc[p] - ac[p, k])
+            dec[p] = np.degrees(np.arctan(-np.cos(hour_angle) / np.tan(np.radians(latitudes[k]))))
+    return dec
+
+
+def crossings_to_records(crossings, planet_names):
+    """交差を [{"planets": (惑星A, 惑星B), "angles": (アングルA, アングルB), "lat", "lon"}, ...] に変換する"""
+    return [
+        {"planets": (planet_names[pa], planet_names[pb]), "angles": (ANGLES[aa], ANGLES[ab]), "lat": float(lat), "lon": float(lon)}
+        for pa, aa, pb, ab, lat, lon in zip(crossings["planet_a"], crossings["angle_a"], crossings["planet_b"], crossings["angle_b"], crossings["lat"], crossings["lon"])
+    ]
+
+
+def _inversion_blocks(ends):
+    """始点順に並んだ終点の列を、入れ替わりが閉じるブロック（要素数 2 以上）に分ける
+
+    位置 i までの最大順位が i に等しい位置がブロックの境界で、入れ替わった組は必ず同じブロックに入る。
+    """
+    ranks = np.empty(len(ends), dtype=np.intp)
+    ranks[np.argsort(ends, kind="stable")] = np.arange(len(ends))
+    boundaries = np.flatnonzero(np.maximum.accumulate(ranks) == np.arange(len(ends)))
+    blocks, begin = [], 0
+    for b in boundaries:
+        if b > begin:
+            blocks.append(np.arange(begin, b + 1))
+        begin = b + 1
+    return blocks
+
+
+def _block_crossings(k, lines, members, seg_start, seg_end, planet_idx):
+    """ブロック内で順序が入れ替わった、異なる惑星のラインの組の交点を返す"""
+    results = []
+    for i in range(len(members)):
+        for j in range(i + 1, len(members)):
+            a, b = members[i], members[j]
+            if planet_idx[lines[i]] == planet_idx[lines[j]]:
+                continue
+            d_start, d_end = seg_start[a] - seg_start[b], seg_end[a] - seg_end[b]
+            if not d_start * d_end < 0:
+                continue
+            t = d_start / (d_start - d_end)
+            lon = seg_start[a] + t * (seg_end[a] - seg_start[a])
+            # 複製どうしの同じ交点は、経度が [-180, 180) に入る組だけを採用する
+            if -180.0 <= lon < 180.0:
+                line_a, line_b = sorted((lines[i], lines[j]), key=lambda line: planet_idx[line])
+                results.append((k, line_a, line_b, t, lon))
+    return results
@@ -0,0 +1,231 @@
+"""天体暦プロバイダ（ネットワークに接続せず、同梱ファイルから天体位置を返す）
+
+- SkyfieldProvider: ローカルの JPL SPK ファイル（.bsp）。jplephem がメモリマップで読み込む。
+- SwissEphProvider: 同梱の Swiss Ephemeris ファイル（ephe/*.se1）。pyswisseph を使う。
+
+get_provider() は環境変数と同梱ファイルの有無から使うプロバイダを決め、プロセス内で使い回す。
+"""
+import datetime
+import functools
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EPHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ephe")
+DEFAULT_SPK_NAME = "de421.bsp"
+
+PLANET_NAMES = ("太陽", "月", "水星", "金星", "火星", "木星", "土星", "天王星", "海王星", "冥王星")
+
+# 惑星名と天体暦（JPL SPK）上のターゲット名
+PLANET_EPH_KEYS = {
+    "太陽": "sun", "月": "moon", "水星": "mercury", "金星": "venus", "火星": "mars",
+    "木星": "jupiter barycenter", "土星": "saturn barycenter", "天王星": "uranus barycenter",
+    "海王星": "neptune barycenter", "冥王星": "pluto barycenter",
+}
+
+# 惑星名と Swiss Ephemeris の天体番号（swisseph.SUN 〜 swisseph.PLUTO）
+SWISS_PLANET_IDS = {name: i for i, name in enumerate(PLANET_NAMES)}
+
+_UNIX_EPOCH_JD = 2440587.5
+# SwissEphProvider が密な日時の列を補間するときの節点の間隔（日）
+INTERP_STEP_DAYS = 0.5
+# Swiss Ephemeris はライブラリで状態（天体暦のパスや開いているファイル）を持つため、
+# 計算は SwissEphProvider のインスタンスをまたいでこのロックで直列化する
+_SWISS_LOCK = threading.Lock()
+# pyswisseph の状態はスレッドごとに持たれ、set_ephe_path を呼んでいないスレッドでは
+# 同梱のファイルではなく精度の低い解析暦（Moshier）で計算される。スレッドごとに設定したパスを覚えておく
+_swiss_thread_state = threading.local()
+
+
+class EphemerisStats:
+    """コールドスタートとクエリごとの所要時間を記録する"""
+
+    def __init__(self, provider_name):
+        self.provider_name = provider_name
+        self.cold_start_s = 0.0
+        self.query_count = 0
+        self.query_total_s = 0.0
+        self.query_max_s = 0.0
+        self._lock = threading.Lock()
+
+    def record_query(self, elapsed_s):
+        with self._lock:
+            self.query_count += 1
+            self.query_total_s += elapsed_s
+            self.query_max_s = max(self.query_max_s, elapsed_s)
+
+    def summary(self):
+        mean_s = self.query_total_s / self.query_count if self.query_count else 0.0
+        return {
+            "provider": self.provider_name,
+            "cold_start_ms": self.cold_start_s * 1e3,
+            "queries": self.query_count,
+            "mean_query_ms": mean_s * 1e3,
+            "max_query_ms": self.query_max_s * 1e3,
+        }
+
+
+def _timed_query(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.stats.record_query(time.perf_counter() - start)
+    return wrapper
+
+
+def _as_datetime_list(datetimes_utc):
+    """単一の日時なら ([日時], True)、日時の列なら (リスト, False) を返す"""
+    if isinstance(datetimes_utc, datetime.datetime):
+        return [datetimes_utc], True
+    return list(datetimes_utc), False
+
+
+def datetime_to_jd(dt_utc):
+    """タイムゾーン付き日時をユリウス日（UT）に変換する"""
+    return _UNIX_EPOCH_JD + dt_utc.timestamp() / 86400.0
+
+
+class SkyfieldProvider:
+    """ローカルの SPK ファイルを Skyfield で読むプロバイダ"""
+
+    name = "skyfield"
+
+    def __init__(self, spk_path):
+        from skyfield.api import load, load_file
+
+        self.stats = EphemerisStats(self.name)
+        start = time.perf_counter()
+        # load_file はダウンロードを行わず、jplephem が SPK の係数をメモリマップで参照する
+        self.eph = load_file(spk_path)
+        self.ts = load.timescale(builtin=True)
+        self._earth = self.eph['earth']
+        self._targets = {name: self.eph[key] for name, key in PLANET_EPH_KEYS.items()}
+        self.stats.cold_start_s = time.perf_counter() - start
+
+    @_timed_query
+    def radec(self, datetimes_utc, planet_names):
+        """視赤経・視赤緯（その日の分点、ラジアン）とグリニッジ視恒星時（ラジアン）を返す
+
+        単一の日時なら ra, dec は (惑星数,)、日時の列なら (惑星数, 時刻数)。
+        地球の位置は一度だけ計算し、全惑星の観測で使い回す。
+        赤経と恒星時は同じ分点（その日の真春分点）で測るので、SwissEphProvider と同じ座標系になる。
+        """
+        dts, scalar = _as_datetime_list(datetimes_utc)
+        t = self.ts.from_datetime(dts[0]) if scalar else self.ts.from_datetimes(dts)
+        observer = self._earth.at(t)
+        ra_list, dec_list = [], []
+        for planet_name in planet_names:
+            ra, dec, _ = observer.observe(self._targets[planet_name]).apparent().radec(epoch='date')
+            ra_list.append(ra.radians)
+            dec_list.append(dec.radians)
+        return np.array(ra_list, dtype=float), np.array(dec_list, dtype=float), t.gast * (np.pi / 12)
+
+
+class SwissEphProvider:
+    """同梱の Swiss Ephemeris ファイル（ephe/*.se1）を読むプロバイダ"""
+
+    name = "swisseph"
+
+    def __init__(self, ephe_dir=EPHE_DIR):
+        import swisseph as swe
+
+        self.stats = EphemerisStats(self.name)
+        start = time.perf_counter()
+        self._swe = swe
+        self._ephe_dir = ephe_dir
+        self._flags = swe.FLG_SWIEPH
+        with _SWISS_LOCK:
+            self._use_ephe_path()
+            # 最初の計算でファイルが開かれるため、ここで一度読み込んでおく
+            swe.calc_ut(_UNIX_EPOCH_JD, swe.SUN, self._flags)
+        self.stats.cold_start_s = time.perf_counter() - start
+
+    @_timed_query
+    def radec(self, datetimes_utc, planet_names):
+        """視赤経・視赤緯（その日の分点、ラジアン）とグリニッジ視恒星時（ラジアン）を返す（形状は SkyfieldProvider と同じ）
+
+        Swiss Ephemeris は 1 回の呼び出しで 1 天体・1 時刻しか計算できない。日時が密な列
+        （INTERP_STEP_DAYS 間隔の節点の数より異なる日時の数が多い場合）は、節点で位置と速度を求めて
+        3 次エルミート補間する（誤差は月でも 0.0001 度未満）。ロックを持つ時間も節点の数に比例する。
+        """
+        swe = self._swe
+        dts, scalar = _as_datetime_list(datetimes_utc)
+        jds = np.array([datetime_to_jd(dt) for dt in dts])
+        nodes = np.arange(np.floor(jds.min() / INTERP_STEP_DAYS), np.ceil(jds.max() / INTERP_STEP_DAYS) + 1) * INTERP_STEP_DAYS
+        # 同じ日時の重複は補間で得をしないので数えない。日時がすべて 1 つの節点上にあると節点が 1 つになり補間できない
+        interpolate = 2 <= len(nodes) < len(np.unique(jds))
+        query_jds = nodes if interpolate else jds
+        flags = self._flags | swe.FLG_EQUATORIAL | (swe.FLG_SPEED if interpolate else 0)
+        positions = np.empty((len(planet_names), len(query_jds), 4))
+        with _SWISS_LOCK:
+            self._use_ephe_path()
+            gst_hours = np.array([swe.sidtime(jd) for jd in jds])
+            for i, planet_name in enumerate(planet_names):
+                for j, jd in enumerate(query_jds):
+                    xx, _ = swe.calc_ut(jd, SWISS_PLANET_IDS[planet_name], flags)
+                    positions[i, j] = xx[0], xx[1], xx[3], xx[4]
+        if interpolate:
+            ra = _hermite(nodes, np.unwrap(positions[..., 0], period=360.0), positions[..., 2], jds) % 360.0
+            dec = _hermite(nodes, positions[..., 1], positions[..., 3], jds)
+        else:
+            ra, dec = positions[..., 0], positions[..., 1]
+        ra, dec, gst_rad = np.radians(ra), np.radians(dec), gst_hours * (np.pi / 12)
+        if scalar:
+            return ra[:, 0], dec[:, 0], gst_rad[0]
+        return ra, dec, gst_rad
+
+    def _use_ephe_path(self):
+        # _SWISS_LOCK を持った状態で呼ぶ。このスレッドでまだ設定していなければ天体暦のパスを設定する
+        if getattr(_swiss_thread_state, "ephe_dir", None) != self._ephe_dir:
+            self._swe.set_ephe_path(self._ephe_dir)
+            _swiss_thread_state.ephe_dir = self._ephe_dir
+
+
+def _hermite(nodes, values, rates, x):
+    """等間隔の節点での値 values と変化率 rates（形状 (..., 節点数)）から x での値を 3 次エルミート補間する"""
+    step = nodes[1] - nodes[0]
+    k = np.clip(((x - nodes[0]) // step).astype(np.intp), 0, len(nodes) - 2)
+    u = (x - nodes[k]) / step
+    u2, u3 = u * u, u * u * u
+    return ((2 * u3 - 3 * u2 + 1) * values[..., k] + (u3 - 2 * u2 + u) * step * rates[..., k]
+            + (3 * u2 - 2 * u3) * values[..., k + 1] + (u3 - u2) * step * rates[..., k + 1])
+
+
+def find_bundled_spk():
+    """環境変数 ASTRO_SPK_PATH または ephe/ に同梱された SPK ファイルのパスを返す（無ければ None）"""
+    candidates = [os.environ.get("ASTRO_SPK_PATH"), os.path.join(EPHE_DIR, DEFAULT_SPK_NAME)]
+    for path in candidates:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_provider(kind=None):
+    """天体暦プロバイダを作成する（プロセス内でキャッシュ）
+
+    kind は "skyfield" / "swisseph"。省略時は環境変数 ASTRO_EPHEMERIS、
+    それも無ければ SPK ファイルが同梱されていれば Skyfield、無ければ Swiss Ephemeris を使う。
+    """
+    kind = kind or os.environ.get("ASTRO_EPHEMERIS")
+    spk_path = find_bundled_spk()
+    if kind is None:
+        kind = SkyfieldProvider.name if spk_path else SwissEphProvider.name
+    if kind == SkyfieldProvider.name:
+        if spk_path is None:
+            raise FileNotFoundError(f"SPK ファイルが見つかりません（{os.path.join(EPHE_DIR, DEFAULT_SPK_NAME)} または ASTRO_SPK_PATH）")
+        provider = SkyfieldProvider(spk_path)
+    elif kind == SwissEphProvider.name:
+        provider = SwissEphProvider()
+    else:
+        raise ValueError(f"不明な天体暦プロバイダです: {kind}")
+    logger.info("天体暦プロバイダ %s を %.1f ms で初期化しました", provider.name, provider.stats.cold_start_s * 1e3)
+    return provider
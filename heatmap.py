@@ -0,0 +1,107 @@
+"""リロケーション・ヒートマップ: 全球の緯度経度グリッドの各セルを ACG ラインへの近さで採点する"""
+import concurrent.futures
+import functools
+import os
+
+import numpy as np
+
+from astro_engine import ANGLES, wrap_lon
+from city_index import DEFAULT_ORB
+
+DEFAULT_GRID_STEP = 0.25
+DEFAULT_CHUNK_ROWS = 32
+ANGLE_WEIGHTS = {"AC": 1.0, "DC": 1.0, "MC": 1.0, "IC": 1.0}
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_executor():
+    """全ての呼び出しで共有するスレッドプール（同時に何枚計算してもスレッド数は CPU 数に収まる）"""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="heatmap")
+
+
+def make_grid(grid_step=DEFAULT_GRID_STEP):
+    """セル中心の緯度（南→北）と経度（西→東）の配列を返す"""
+    lats = np.arange(-90.0 + grid_step / 2, 90.0, grid_step)
+    lons = np.arange(-180.0 + grid_step / 2, 180.0, grid_step)
+    return lats, lons
+
+
+def line_lons_at(arrays, grid_lats):
+    """各惑星・各アングルのラインが grid_lats の緯度で通る経度を (惑星数, 4, 緯度数) で返す
+
+    ラインが存在しない緯度（AC/DC が地平線と交わらない緯度、ラインの緯度範囲の外）は NaN。
+    """
+    latitudes = np.asarray(arrays["latitudes"], dtype=float)
+    in_range = (grid_lats >= latitudes[0]) & (grid_lats <= latitudes[-1])
+    out = np.full((len(arrays["planets"]), len(ANGLES), len(grid_lats)), np.nan)
+    for a, angle in enumerate(ANGLES):
+        values = np.asarray(arrays[angle], dtype=float)
+        for p in range(len(arrays["planets"])):
+            if values.ndim == 1:
+                out[p, a, in_range] = values[p]
+                continue
+            valid = np.isfinite(values[p])
+            if valid.sum() < 2:
+                continue
+            lats, lons = latitudes[valid], np.degrees(np.unwrap(np.radians(values[p, valid])))
+            inside = (grid_lats >= lats[0]) & (grid_lats <= lats[-1])
+            out[p, a, inside] = wrap_lon(np.interp(grid_lats[inside], lats, lons))
+    return out
+
+
+def evaluate_heatmap(arrays, grid_step=DEFAULT_GRID_STEP, orb=DEFAULT_ORB, angle_weights=None, chunk_rows=DEFAULT_CHUNK_ROWS, workers=None):
+    """惑星ごとのスコア格子を計算する
+
+    セルとラインの距離は、セルの緯度でラインが通る経度との差を大円上の角距離
+    asin(cos 緯度 · sin 経度差) に直したもの（経度差は 90 度で打ち切る）。
+    スコアは Σ アングルの重み · exp(-(距離 / orb)² / 2)。
+    緯度方向に chunk_rows 行ずつ分け、スレッドで並列に処理する（NumPy の演算は GIL を解放する）。
+    workers=None ではプロセス内で共有するプールを使うので、複数のセッションから同時に呼ばれても
+    スレッド数と作業用配列の数は CPU 数までに抑えられる。workers=1 では呼び出し元のスレッドで順に処理する。
+    戻り値は "lats", "lons" と、形状 (惑星数, 緯度数, 経度数) の float32 配列 "scores" を持つ辞書。
+    """
+    angle_weights = {**ANGLE_WEIGHTS, **(angle_weights or {})}
+    weights = np.array([angle_weights[angle] for angle in ANGLES], dtype=np.float32)
+    grid_lats, grid_lons = make_grid(grid_step)
+    line_lons = line_lons_at(arrays, grid_lats)
+    scores = np.zeros((len(arrays["planets"]), len(grid_lats), len(grid_lons)), dtype=np.float32)
+
+    # 経度差の sin・cos は加法定理で求め、グリッド経度の三角関数は一度だけ計算する
+    grid_rad = np.radians(grid_lons).astype(np.float32)
+    sin_grid, cos_grid = np.sin(grid_rad), np.cos(grid_rad)
+    line_rad = np.radians(line_lons).astype(np.float32)
+    sin_line, cos_line = np.sin(line_rad), np.cos(line_rad)
+    cos_lat_all = np.cos(np.radians(grid_lats)).astype(np.float32)
+    # orb の 4 倍より遠いセルの寄与（exp(-8) 未満）は 0 とみなし、arcsin と exp を省く
+    cutoff = np.float32(np.sin(np.radians(min(4.0 * orb, 90.0))))
+
+    def evaluate_rows(row_slice):
+        s_line, c_line = sin_line[:, :, row_slice, None], cos_line[:, :, row_slice, None]
+        sin_diff = sin_grid * c_line - cos_grid * s_line
+        cos_diff = cos_grid * c_line + sin_grid * s_line
+        x = cos_lat_all[row_slice, None] * np.where(cos_diff > 0, np.abs(sin_diff), np.float32(1.0))
+        # ラインが存在しない緯度（NaN）は寄与させない
+        near = (x < cutoff) & ~np.isnan(sin_diff)
+        kernel = np.zeros(x.shape, dtype=np.float32)
+        kernel[near] = np.exp(-0.5 * (np.degrees(np.arcsin(x[near])) / orb) ** 2)
+        scores[:, row_slice, :] = np.einsum('a,pafg->pfg', weights, kernel)
+
+    slices = [slice(start, start + chunk_rows) for start in range(0, len(grid_lats), chunk_rows)]
+    if workers is None:
+        list(_shared_executor().map(evaluate_rows, slices))
+    elif workers <= 1:
+        for row_slice in slices:
+            evaluate_rows(row_slice)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(evaluate_rows, slices))
+    return {"lats": grid_lats, "lons": grid_lons, "scores": scores}
+
+
+def downsample(lats, lons, score, factor):
+    """factor × factor セルごとに平均をとって解像度を落とす（描画用）"""
+    if factor <= 1:
+        return lats, lons, score
+    n_lat, n_lon = len(lats) // factor * factor, len(lons) // factor * factor
+    blocks = score[:n_lat, :n_lon].reshape(n_lat // factor, factor, n_lon // factor, factor)
+    return lats[:n_lat].reshape(-1, factor).mean(axis=1), lons[:n_lon].reshape(-1, factor).mean(axis=1), blocks.mean(axis=(1, 3))
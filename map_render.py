@@ -0,0 +1,183 @@
+"""地図描画の軽量化: ラインの結合・簡略化と、図の静的出力・JSON キャッシュ"""
+import hashlib
+import json
+import os
+
+import threading
+
+import numpy as np
+import plotly.io as pio
+
+DEFAULT_SIMPLIFY_TOLERANCE = 0.05  # 度
+# 図の JSON キャッシュのキーに含める版数。plot_map の出力（トレースの構成や配色）を変えたら上げ、古い図を使わないようにする
+FIGURE_RENDER_VERSION = 1
+DEFAULT_FIGURE_CACHE_BYTES = 512 * 1024 * 1024
+# 上限を超えたら、合計がこの割合になるまで古いファイルを消す（ChartCache のディスク層と同じ）
+_FIGURE_CACHE_PRUNE_RATIO = 0.9
+
+
+def split_at_antimeridian(lons, lats):
+    """経度が ±180 度をまたぐ箇所に NaN を挟み、地図上で横断線が引かれないようにする"""
+    lons, lats = np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)
+    if len(lons) < 2:
+        return lons, lats
+    jumps = np.where(np.abs(np.diff(lons)) > 180)[0]
+    return np.insert(lons, jumps + 1, np.nan), np.insert(lats, jumps + 1, np.nan)
+
+
+def simplify_polyline(lons, lats, tolerance=DEFAULT_SIMPLIFY_TOLERANCE):
+    """Douglas-Peucker 法で折れ線を間引く（NaN で区切られた区間ごとに処理する）
+
+    tolerance は経度・緯度平面上での許容誤差（度）。区間の端点は必ず残す。
+    """
+    lons, lats = np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)
+    if tolerance <= 0 or len(lons) < 3:
+        return lons, lats
+    keep = np.isnan(lons)
+    breaks = np.flatnonzero(keep)
+    for start, end in zip(np.concatenate([[0], breaks + 1]), np.concatenate([breaks, [len(lons)]])):
+        if end > start:
+            keep[start:end] = _douglas_peucker_mask(lons[start:end], lats[start:end], tolerance)
+    return lons[keep], lats[keep]
+
+
+def merge_polylines(polylines):
+    """[(lons, lats), ...] を NaN 区切りで 1 本の配列にまとめる（1 トレースで描画するため）"""
+    lon_parts, lat_parts = [], []
+    separator = np.array([np.nan])
+    for lons, lats in polylines:
+        if len(lons) == 0:
+            continue
+        if lon_parts:
+            lon_parts.append(separator)
+            lat_parts.append(separator)
+        lon_parts.append(np.asarray(lons, dtype=float))
+        lat_parts.append(np.asarray(lats, dtype=float))
+    if not lon_parts:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(lon_parts), np.concatenate(lat_parts)
+
+
+def merge_hovertext(polylines, labels):
+    """merge_polylines の結果と同じ並びで、各点にそのポリラインのラベルを付けたリストを返す（区切りの点は空文字）"""
+    texts = []
+    for (lons, _), label in zip(polylines, labels):
+        if len(lons) == 0:
+            continue
+        if texts:
+            texts.append("")
+        texts.extend([label] * len(lons))
+    return texts
+
+
+def _douglas_peucker_mask(x, y, tolerance):
+    keep = np.zeros(len(x), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(x) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        px, py = x[i + 1:j] - x[i], y[i + 1:j] - y[i]
+        norm = np.hypot(dx, dy)
+        dist = np.hypot(px, py) if norm == 0 else np.abs(px * dy - py * dx) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            mid = i + 1 + k
+            keep[mid] = True
+            stack.extend([(i, mid), (mid, j)])
+    return keep
+
+
+# --- 図の出力 ---
+def save_figure(fig, path):
+    """拡張子に応じて図を保存する（.html / .json / .png / .svg。画像の出力には kaleido が必要）
+
+    fig は go.Figure か、load_or_build_figure がキャッシュから読んだ図の辞書（検証済みなので再検証しない）。
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".html":
+        pio.write_html(fig, path, include_plotlyjs="cdn", validate=False)
+    elif ext == ".json":
+        pio.write_json(fig, path, validate=False)
+    elif ext in (".png", ".svg"):
+        pio.write_image(fig, path, format=ext[1:], validate=False)
+    else:
+        raise ValueError(f"対応していない出力形式です: {ext}")
+
+
+def figure_cache_path(cache_dir, key):
+    """図の入力を表すキー（タプル）から、cache_dir 内の JSON キャッシュのパスを返す（キーには FIGURE_RENDER_VERSION を加える）"""
+    digest = hashlib.sha1(repr((FIGURE_RENDER_VERSION,) + tuple(key)).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.json")
+
+
+def load_or_build_figure(cache_path, build, max_bytes=DEFAULT_FIGURE_CACHE_BYTES):
+    """JSON にキャッシュした図があれば辞書として読み込み、無ければ build() で作って保存する
+
+    キャッシュからは plotly の検証を通さずに読む（pio.read_json は検証で図を作り直すより遅くなる）。
+    戻り値はそのまま save_figure に渡せる。キャッシュのディレクトリが合計 max_bytes（None なら無制限）を
+    超えたら、更新時刻の古い順に消す（読み込んだファイルは更新時刻を新しくする）。
+    """
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                fig = json.load(f)
+            os.utime(cache_path)
+            return fig
+        except (OSError, ValueError):
+            pass  # 他のプロセスが同時に消した・壊れたファイルは作り直す
+    fig = build()
+    cache_dir = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fig.write_json(tmp_path)
+    size = os.path.getsize(tmp_path)
+    os.replace(tmp_path, cache_path)
+    if max_bytes is not None:
+        _account_figure_cache(cache_dir, size, max_bytes)
+    return fig
+
+
+# キャッシュのディレクトリごとの合計バイト数の見積もり（このプロセスが書いた分を足していき、上限を超えたら数え直す）
+_figure_cache_bytes = {}
+_figure_cache_lock = threading.Lock()
+
+
+def _account_figure_cache(cache_dir, size, max_bytes):
+    with _figure_cache_lock:
+        if cache_dir not in _figure_cache_bytes:
+            _figure_cache_bytes[cache_dir] = sum(size for _, _, size in _figure_cache_files(cache_dir))
+        else:
+            _figure_cache_bytes[cache_dir] += size
+        if _figure_cache_bytes[cache_dir] <= max_bytes:
+            return
+        # 他のプロセスも同じディレクトリに書くので、合計はディレクトリを数え直して求める
+        files = sorted(_figure_cache_files(cache_dir))
+        total = sum(size for _, _, size in files)
+        target = max_bytes * _FIGURE_CACHE_PRUNE_RATIO
+        for _, path, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        _figure_cache_bytes[cache_dir] = total
+
+
+def _figure_cache_files(cache_dir):
+    """キャッシュの (更新時刻, パス, バイト数) のリスト（他のプロセスが同時に消したファイルは除く）"""
+    files = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, entry.path, stat.st_size))
+    return files
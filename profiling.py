@@ -0,0 +1,32 @@
+"""処理段階ごとの所要時間の計測"""
+import contextlib
+import time
+
+
+class StageTimer:
+    """段階名ごとに所要時間（秒）を積算する"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, elapsed_s):
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed_s
+
+    def merge(self, timings):
+        for name, elapsed_s in timings.items():
+            self.add(name, elapsed_s)
+
+    def total(self):
+        return sum(self.timings.values())
+
+    def format_lines(self, count=1):
+        """「段階名: 合計 ms（1 件あたり ms）」の行のリストを返す"""
+        return [f"{name}: {elapsed_s * 1e3:.1f} ms（1 件あたり {elapsed_s * 1e3 / max(count, 1):.1f} ms）" for name, elapsed_s in self.timings.items()]